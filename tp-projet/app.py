@@ -1,12 +1,21 @@
 import os
-from flask import Flask, render_template, session
+from flask import Flask, Response, render_template, session
 from config import config
 from src.auth import auth_bp
+from src.auth.passwords import init_password_hasher
+from src.auth.throttle import init_login_throttle
 from src.cart.routes import cart_bp
 from src.catalog.routes import catalog_bp
 from src.models.database import db
 from src.api import api_bp
+from src.assets import assets_bp
+from src.assets.images import product_picture
+from src.assets.manifest import assets_version
+from src.assets.static_files import asset_url_for
 from src.cart import services as cart_services
+from src.catalog import services as catalog_services
+from src.services.fragment_cache import FragmentCacheExtension, LRUFragmentStore
+from src.services.session_store import init_session_store
 
 def create_app() -> Flask:
     config_name: str = os.environ.get("FLASK_CONFIG", "development")
@@ -15,12 +24,25 @@ def create_app() -> Flask:
     app.config.from_object(config[config_name])
     app.jinja_env.trim_blocks = True
     app.jinja_env.lstrip_blocks = True
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = LRUFragmentStore(  # type: ignore[attr-defined]
+        max_entries=app.config["FRAGMENT_CACHE_SIZE"], default_ttl=app.config["FRAGMENT_CACHE_TTL"]
+    )
+    app.jinja_env.globals["product_picture"] = product_picture
+    # url_for('static', ...) pointe vers la version à empreinte quand build_assets.py a été lancé
+    app.jinja_env.globals["url_for"] = asset_url_for
     db.init_app(app)
+    # Le cookie ne garde que l'identifiant de session, le panier reste sur le serveur
+    init_session_store(app)
+    # Hachage des mots de passe dans un pool de processus borné, hors du worker HTTP
+    init_password_hasher(app)
+    init_login_throttle(app)
 
     app.register_blueprint(catalog_bp, url_prefix="/products")
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(cart_bp, url_prefix="/cart")
     app.register_blueprint(api_bp, url_prefix="/api")
+    app.register_blueprint(assets_bp, url_prefix="/assets")
 
     @app.context_processor
     def inject_cart_count():
@@ -28,6 +50,19 @@ def create_app() -> Flask:
         count = cart_services.get_count(user_id)
         return dict(cart_count=count)
 
+    @app.after_request
+    def flush_cart_writes(response: Response) -> Response:
+        # Panier des utilisateurs connectés et réservations de stock : une seule
+        # transaction pour toutes les modifications de la requête
+        cart_services.flush_writes()
+        return response
+
+    @app.context_processor
+    def inject_catalog_version() -> dict[str, str]:
+        # Versions du catalogue et des ressources générées (URL à empreinte), utilisées dans les
+        # clés du cache de fragments ({% cache %})
+        return dict(catalog_version=catalog_services.get_snapshot().version, assets_version=assets_version())
+
     @app.route("/")
     def home() -> str:
         user_id = session.get('user_id')
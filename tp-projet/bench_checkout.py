@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai de la validation de commande (POST /api/cart/checkout) sous concurrence.
+
+    python bench_checkout.py                        # 200 clients, 8 threads
+    python bench_checkout.py --users 500 --threads 16 --stock 300
+
+Chaque client remplit un panier, puis tous valident en même temps, chacun deux fois avec la
+même clé d'idempotence (nouvel essai après une coupure réseau). Le stock du produit disputé est
+volontairement insuffisant et les réservations sont effacées avant la course : toutes les
+commandes se disputent le décrément final. Le script mesure le débit et vérifie que le stock ne
+devient jamais négatif et qu'aucune commande n'est créée deux fois.
+
+Travaille sur une base SQLite temporaire, jamais sur app.db, et garde ses fichiers annexes
+(témoins, sessions, créneaux de hachage) dans le même répertoire temporaire, hors de instance/.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+_workdir = tempfile.mkdtemp(prefix="bench_checkout_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ["CATALOG_STAMP_FILE"] = os.path.join(_workdir, "catalog.stamp")
+os.environ["USERS_STAMP_FILE"] = os.path.join(_workdir, "users.stamp")
+os.environ["USERS_REBUILD_STAMP_FILE"] = os.path.join(_workdir, "users-rebuild.stamp")
+os.environ["SESSION_SQLITE_PATH"] = os.path.join(_workdir, "sessions.db")
+os.environ["SESSION_FILE_DIR"] = os.path.join(_workdir, "sessions")
+os.environ["LOGIN_THROTTLE_SQLITE_PATH"] = os.path.join(_workdir, "login_throttle.db")
+os.environ["PASSWORD_HASH_SLOT_DIR"] = os.path.join(_workdir, "hash_slots")
+
+from app import app  # noqa: E402  (la base doit être choisie avant l'import)
+from src.models.cart import Cart  # noqa: E402
+from src.models.database import db  # noqa: E402
+from src.models.product import Product  # noqa: E402
+from src.models.stock_reservation import StockReservation  # noqa: E402
+from src.models.user import User  # noqa: E402
+
+
+def create_clients(count: int) -> list[tuple[int, object]]:
+    """Crée les utilisateurs (mot de passe factice, le hachage n'est pas mesuré ici)."""
+    with app.app_context():
+        db.session.execute(
+            db.insert(User),
+            [
+                {
+                    "username": f"bench{i}",
+                    "firstname": "Bench",
+                    "lastname": str(i),
+                    "password": "-",
+                    "email": f"bench{i}@example.com",
+                }
+                for i in range(count)
+            ],
+        )
+        db.session.commit()
+        user_ids = list(db.session.scalars(db.select(User.id).where(User.username.like("bench%"))))
+    clients = []
+    for user_id in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+        clients.append((user_id, client))
+    return clients
+
+
+def fill_carts(clients: list[tuple[int, object]], contested_id: int, other_id: int) -> None:
+    operations = [
+        {"op": "add", "product_id": contested_id, "quantity": 1},
+        {"op": "add", "product_id": other_id, "quantity": 1},
+    ]
+    for _, client in clients:
+        response = client.post("/api/cart/batch", json={"operations": operations})
+        if response.status_code != 200:
+            sys.exit(f"Remplissage du panier impossible : {response.get_json()}")
+
+
+def checkout_twice(client) -> tuple[list[int], float]:
+    """Valide puis renvoie la même requête ; retourne les codes HTTP et la durée de la première."""
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    start = time.perf_counter()
+    first = client.post("/api/cart/checkout", headers=headers).status_code
+    elapsed = time.perf_counter() - start
+    second = client.post("/api/cart/checkout", headers=headers).status_code
+    return [first, second], elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=200, help="nombre de clients")
+    parser.add_argument("--threads", type=int, default=8, help="validations simultanées")
+    parser.add_argument(
+        "--stock", type=int, default=None, help="stock du produit disputé (défaut : users / 2)"
+    )
+    args = parser.parse_args()
+    contested_stock = args.stock if args.stock is not None else args.users // 2
+
+    with app.app_context():
+        db.engine.echo = False  # SQLALCHEMY_ECHO de la configuration de développement
+        contested_id, other_id = db.session.scalars(db.select(Product.id).order_by(Product.id).limit(2))
+        db.session.execute(db.update(Product).values(stock_quantity=args.users * 2))
+        db.session.commit()
+
+    print(f"🛒 {args.users} paniers, {args.threads} threads, stock disputé : {contested_stock}")
+    clients = create_clients(args.users)
+    fill_carts(clients, contested_id, other_id)
+
+    with app.app_context():
+        # Réservations perdues (expirées) et stock devenu insuffisant : la validation doit
+        # décrocher elle-même le stock, en concurrence avec les autres
+        db.session.execute(db.delete(StockReservation).where(StockReservation.product_id == contested_id))
+        db.session.execute(
+            db.update(Product).where(Product.id == contested_id).values(stock_quantity=contested_stock)
+        )
+        db.session.commit()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda item: checkout_twice(item[1]), clients))
+    wall = time.perf_counter() - start
+
+    statuses = Counter(status for codes, _ in results for status in codes)
+    latencies = sorted(elapsed for _, elapsed in results)
+    with app.app_context():
+        final_stock = db.session.scalar(db.select(Product.stock_quantity).where(Product.id == contested_id))
+        orders = db.session.scalar(
+            db.select(db.func.count(Cart.id)).where(
+                Cart.status == "ordered", Cart.user_id.in_([user_id for user_id, _ in clients])
+            )
+        )
+    placed = statuses[201]
+
+    print(f"⏱️  {len(clients)} validations en {wall:.2f} s, soit {len(clients) / wall:.1f} commandes/s")
+    print(f"   latence médiane {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms")
+    print(f"   codes HTTP : {dict(sorted(statuses.items()))}")
+    print(f"   commandes en base : {orders}, stock restant du produit disputé : {final_stock}")
+
+    errors = []
+    if final_stock < 0:
+        errors.append("stock négatif")
+    if orders != placed:
+        errors.append("commandes en double ou perdues")
+    if placed != min(contested_stock, len(clients)):
+        errors.append(f"{placed} commandes acceptées pour un stock de {contested_stock}")
+    if errors:
+        sys.exit("❌ " + ", ".join(errors))
+    print("✅ Stock cohérent, aucune commande en double.")
+
+
+if __name__ == "__main__":
+    main()
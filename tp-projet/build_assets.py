@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Génération hors ligne des ressources statiques optimisées (dans ASSET_BUILD_DIR).
+
+    python build_assets.py all               # tout (images + fichiers statiques)
+    python build_assets.py images            # déclinaisons des images produits
+    python build_assets.py static            # CSS/JS/SVG à empreinte + versions .gz/.br
+    python build_assets.py images --force    # tout régénérer
+    python build_assets.py images --workers 4
+    python build_assets.py gc                # supprime les versions retirées (délai de grâce écoulé)
+
+Nécessite Pillow (et brotli pour les versions .br) : pip install -e ".[assets]"
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from app import app
+from src.assets.images import build_images, collect_images
+from src.assets.static_files import build_static, collect_static
+from src.models.database import db
+from src.models.product import Product
+from src.models.product_image import ProductImage
+
+STATIC_DIR = Path(app.root_path) / "static"
+PRODUCT_IMAGES_DIR = STATIC_DIR / "img" / "products"
+
+
+def product_image_names() -> set[str]:
+    """Noms de toutes les images référencées par le catalogue (image principale et galerie)."""
+    names = set(db.session.scalars(db.select(Product.image).where(Product.image.isnot(None))))
+    names.update(db.session.scalars(db.select(ProductImage.url)))
+    return {name for name in names if name}
+
+
+def build_product_images(workers: int | None, force: bool) -> int:
+    with app.app_context():
+        names = product_image_names()
+        build_dir = Path(app.config["ASSET_BUILD_DIR"])
+    print(f"🖼️  {len(names)} images référencées, génération dans {build_dir}")
+    report = build_images(names, PRODUCT_IMAGES_DIR, build_dir, workers=workers, force=force)
+    print(
+        f"✅ {len(report.processed)} traitées, {len(report.skipped)} inchangées, "
+        f"{len(report.retired)} anciennes déclinaisons gardées jusqu'au prochain gc"
+    )
+    for name in report.missing:
+        print(f"⚠️  Image source introuvable : {name}")
+    for name, error in report.failed.items():
+        print(f"❌ {name} : {error}")
+    return 1 if report.failed else 0
+
+
+def build_static_files() -> int:
+    with app.app_context():
+        build_dir = Path(app.config["ASSET_BUILD_DIR"])
+    report = build_static(STATIC_DIR, build_dir)
+    print(f"📦 {len(report.processed)} fichiers statiques générés, {len(report.skipped)} inchangés")
+    if not report.brotli:
+        print("⚠️  Module brotli absent : seules les versions .gz ont été produites")
+    return 0
+
+
+def collect_retired_assets(grace_days: float | None) -> int:
+    with app.app_context():
+        build_dir = Path(app.config["ASSET_BUILD_DIR"])
+        grace = app.config["ASSET_GC_GRACE"] if grace_days is None else grace_days * 24 * 3600
+    images = collect_images(build_dir, grace)
+    static = collect_static(build_dir, grace)
+    print(f"🧹 {len(images)} déclinaisons d'images et {len(static)} fichiers statiques supprimés")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    images = commands.add_parser("images", help="déclinaisons des images produits (JPEG + WebP)")
+    images.add_argument("--workers", type=int, default=None, help="nombre de processus (défaut : nb de CPU)")
+    images.add_argument("--force", action="store_true", help="régénérer même les images inchangées")
+    commands.add_parser("static", help="CSS/JS/SVG à empreinte et versions précompressées")
+    everything = commands.add_parser("all", help="images puis fichiers statiques")
+    everything.add_argument("--workers", type=int, default=None)
+    everything.add_argument("--force", action="store_true")
+    gc = commands.add_parser("gc", help="supprime les versions retirées depuis le délai de grâce")
+    gc.add_argument(
+        "--grace-days", type=float, default=None, help="délai de grâce en jours (défaut : ASSET_GC_GRACE)"
+    )
+
+    args = parser.parse_args()
+    status = 0
+    if args.command in ("images", "all"):
+        status |= build_product_images(args.workers, args.force)
+    if args.command in ("static", "all"):
+        status |= build_static_files()
+    if args.command == "gc":
+        status |= collect_retired_assets(args.grace_days)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
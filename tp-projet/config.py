@@ -41,6 +41,58 @@ class Config:
     )
     SQLALCHEMY_DATABASE_URI: str = _get_database_uri()
     SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
+    # Fichier témoin remplacé à chaque modification du catalogue : les workers comparent
+    # son identité pour savoir si leur copie en mémoire du catalogue est périmée
+    CATALOG_STAMP_FILE: str = os.environ.get("CATALOG_STAMP_FILE") or str(
+        BASE_DIR / "instance" / "catalog.stamp"
+    )
+    # Témoins des créations d'utilisateurs (ajout aux filtres) et des changements d'identifiant ou
+    # d'email (reconstruction), et taux de faux positifs des filtres de Bloom de /api/user/check
+    # (src/auth/availability.py)
+    USERS_STAMP_FILE: str = os.environ.get("USERS_STAMP_FILE") or str(BASE_DIR / "instance" / "users.stamp")
+    USERS_REBUILD_STAMP_FILE: str = os.environ.get("USERS_REBUILD_STAMP_FILE") or str(
+        BASE_DIR / "instance" / "users-rebuild.stamp"
+    )
+    USER_BLOOM_FALSE_POSITIVE_RATE: float = 0.01
+    # Cache de fragments Jinja ({% cache %}) : nombre maximal d'entrées par worker et durée de vie
+    FRAGMENT_CACHE_SIZE: int = 2048
+    FRAGMENT_CACHE_TTL: int = 3600
+    # Réservations de stock des paniers : durée de vie et intervalle minimal entre deux balayages
+    STOCK_RESERVATION_TTL: int = 30 * 60
+    STOCK_RESERVATION_SWEEP_INTERVAL: int = 60
+    # Hachage des mots de passe (src/auth/passwords.py) : méthode werkzeug, calculs simultanés pour
+    # tous les workers HTTP (None = la moitié des cœurs) au-delà desquels on répond 503, et dossier
+    # des fichiers verrous de ces créneaux (partagé par les workers)
+    PASSWORD_HASH_METHOD: str = os.environ.get("PASSWORD_HASH_METHOD") or "scrypt:32768:8:1"
+    PASSWORD_HASH_SALT_LENGTH: int = 16
+    PASSWORD_HASH_SLOTS: int | None = None
+    PASSWORD_HASH_SLOT_DIR: str = os.environ.get("PASSWORD_HASH_SLOT_DIR") or str(
+        BASE_DIR / "instance" / "hash_slots"
+    )
+    PASSWORD_HASH_RETRY_AFTER: int = 2
+    # Limitation des tentatives de connexion (src/auth/throttle.py) : seaux par IP et par identifiant,
+    # gardés dans chaque worker ("memory") ou partagés par les workers ("sqlite")
+    LOGIN_THROTTLE_STORE: str = os.environ.get("LOGIN_THROTTLE_STORE") or "memory"
+    LOGIN_THROTTLE_SQLITE_PATH: str = os.environ.get("LOGIN_THROTTLE_SQLITE_PATH") or str(
+        BASE_DIR / "instance" / "login_throttle.db"
+    )
+    LOGIN_THROTTLE_IP_BURST: int = 20
+    LOGIN_THROTTLE_IP_PER_MINUTE: float = 20
+    LOGIN_THROTTLE_USERNAME_BURST: int = 5
+    LOGIN_THROTTLE_USERNAME_PER_MINUTE: float = 5
+    LOGIN_THROTTLE_MAX_KEYS: int = 100_000
+    # Sessions côté serveur (src/services/session_store.py) : "sqlite", "file" ou "cookie" (Flask)
+    SESSION_STORE: str = os.environ.get("SESSION_STORE") or "sqlite"
+    SESSION_SQLITE_PATH: str = os.environ.get("SESSION_SQLITE_PATH") or str(
+        BASE_DIR / "instance" / "sessions.db"
+    )
+    SESSION_FILE_DIR: str = os.environ.get("SESSION_FILE_DIR") or str(BASE_DIR / "instance" / "sessions")
+    SESSION_EVICT_INTERVAL: int = 300
+    # Ressources générées par build_assets.py (déclinaisons d'images), servies sous /assets
+    ASSET_BUILD_DIR: str = os.environ.get("ASSET_BUILD_DIR") or str(BASE_DIR / "static" / "build")
+    # Délai avant suppression des versions remplacées (images, fichiers statiques ; build_assets.py gc) :
+    # plus long que la durée de vie des fragments en cache et des pages ouvertes
+    ASSET_GC_GRACE: int = 7 * 24 * 3600
 
 
 class DevelopmentConfig(Config):
@@ -57,6 +109,8 @@ class TestingConfig(Config):
     DEBUG: bool = False
     # Base de données en mémoire
     SQLALCHEMY_DATABASE_URI: str = "sqlite:///:memory:"
+    # Hachage peu coûteux pour les tests
+    PASSWORD_HASH_METHOD: str = "pbkdf2:sha256:1000"
 
 
 class ProductionConfig(Config):
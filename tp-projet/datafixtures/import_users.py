@@ -1,30 +1,164 @@
 """
 Script pour charger les utilisateurs depuis un fichier JSON dans la base SQLite.
+
+Import en masse (jeux de données de test de charge) :
+
+    python -m datafixtures.import_users                          # datafixtures/json/users.json
+    python -m datafixtures.import_users --generate 100000 --fast-hash
+    python -m datafixtures.import_users --file users.json --workers 8 --chunk-size 5000
+
+Les usernames et emails déjà présents sont lus en une requête, les mots de passe sont hachés en
+parallèle dans un pool de processus pendant que les lots précédents sont insérés (executemany,
+un commit par lot). --fast-hash remplace la méthode de hachage configurée par une méthode peu
+coûteuse (FAST_HASH_METHOD) : à réserver aux bases de développement et de test.
 """
 
+import argparse
 import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator
 
+from flask import current_app
 from werkzeug.security import generate_password_hash
 
+from app import app
 from src.models import User
 from src.models.database import db
 
 USERS_FILE = "datafixtures/json/users.json"
 
+CHUNK_SIZE = 2000
+# Hachage peu coûteux pour les bases de test (jamais en production)
+FAST_HASH_METHOD = "pbkdf2:sha256:1000"
+# En dessous, le démarrage d'un pool de processus coûte plus qu'il ne rapporte
+POOL_MIN_USERS = 64
+
+
+def generate_users(count: int, prefix: str = "load") -> list[dict]:
+    """Utilisateurs fictifs pour les tests de charge (mot de passe : Password1!)."""
+    return [
+        {
+            "username": f"{prefix}{i}",
+            "firstname": "Test",
+            "lastname": f"Charge{i}",
+            "password": "Password1!",
+            "email": f"{prefix}{i}@example.com",
+            "role": "client",
+        }
+        for i in range(1, count + 1)
+    ]
+
 
-def load_users() -> None:
+def _new_users(users: Iterable[dict]) -> list[dict]:
+    """Écarte en une requête les utilisateurs déjà en base (username ou email) et les doublons du fichier."""
+    taken_usernames = set(db.session.scalars(db.select(User.username)))
+    taken_emails = set(db.session.scalars(db.select(db.func.lower(User.email))))
+    new_users = []
+    for user in users:
+        email = user["email"].lower()
+        if user["username"] in taken_usernames or email in taken_emails:
+            continue
+        taken_usernames.add(user["username"])
+        taken_emails.add(email)
+        new_users.append(user)
+    return new_users
+
+
+def _hashed(users: list[dict], method: str, salt_length: int, workers: int | None) -> Iterator[dict]:
+    """Utilisateurs avec leur mot de passe haché, dans l'ordre, calculés par le pool au fil de l'eau."""
+    hash_one = partial(generate_password_hash, method=method, salt_length=salt_length)
+    passwords = [user["password"] for user in users]
+    if len(users) < POOL_MIN_USERS or workers == 0:
+        hashes: Iterable[str] = map(hash_one, passwords)
+        for user, pwhash in zip(users, hashes):
+            yield {**user, "password": pwhash}
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Envoi par paquets : un aller-retour entre processus par paquet, pas par mot de passe
+        hashes = pool.map(hash_one, passwords, chunksize=max(1, min(256, len(users) // (workers * 8))))
+        for user, pwhash in zip(users, hashes):
+            yield {**user, "password": pwhash}
+
+
+def load_users(
+    users: list[dict] | None = None,
+    workers: int | None = None,
+    fast_hash: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    verbose: bool = False,
+) -> int:
     """
-    Charge les utilisateurs depuis un fichier JSON et les ajoute à la base de données SQLite.
-    Si un utilisateur existe déjà (même username), il n'est pas ajouté à nouveau.
+    Charge les utilisateurs (par défaut ceux du fichier JSON) et les ajoute à la base de données.
+    Si un utilisateur existe déjà (même username ou même email), il n'est pas ajouté à nouveau.
+    Retourne le nombre d'utilisateurs ajoutés.
     """
-    with open(USERS_FILE, encoding="utf-8") as f:
-        users = json.load(f)
-    for user in users:
-        # Vérifier si l'utilisateur existe déjà
-        if not User.find_by_username(username=user["username"]):
-            # Hasher le mot de passe avant insertion
-            user["password"] = generate_password_hash(user["password"])
-            user = User(**user)
-            db.session.add(user)
+    if users is None:
+        with open(USERS_FILE, encoding="utf-8") as f:
+            users = json.load(f)
+    config = current_app.config
+    method = FAST_HASH_METHOD if fast_hash else config["PASSWORD_HASH_METHOD"]
+
+    new_users = _new_users(users)
+    start = time.perf_counter()
+    inserted = 0
+    chunk: list[dict] = []
+    for user in _hashed(new_users, method, config["PASSWORD_HASH_SALT_LENGTH"], workers):
+        chunk.append(user)
+        if len(chunk) >= chunk_size:
+            inserted += _insert_chunk(chunk)
+            chunk = []
+            if verbose:
+                rate = inserted / (time.perf_counter() - start)
+                print(f"  {inserted}/{len(new_users)} utilisateurs ({rate:.0f}/s)", flush=True)
+    if chunk:
+        inserted += _insert_chunk(chunk)
+
+    print(f"{inserted} utilisateurs ajoutés ({len(users) - len(new_users)} déjà présents ou en double).")
+    return inserted
+
+
+def _insert_chunk(chunk: list[dict]) -> int:
+    # Une liste de dicts : SQLAlchemy envoie un INSERT multi-lignes / executemany
+    db.session.execute(db.insert(User), chunk)
     db.session.commit()
-    print(f"{len(users)} utilisateurs chargés.")
+    return len(chunk)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--file", default=USERS_FILE, help="fichier JSON des utilisateurs")
+    parser.add_argument(
+        "--generate", type=int, metavar="N", help="génère N utilisateurs fictifs au lieu du fichier"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processus de hachage (défaut : nombre de cœurs)"
+    )
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="utilisateurs insérés par lot")
+    parser.add_argument("--fast-hash", action="store_true", help=f"hachage peu coûteux ({FAST_HASH_METHOD})")
+    args = parser.parse_args()
+
+    if args.fast_hash and os.environ.get("FLASK_CONFIG") == "production":
+        sys.exit("--fast-hash est interdit en production")
+
+    if args.generate:
+        users = generate_users(args.generate)
+    else:
+        with open(args.file, encoding="utf-8") as f:
+            users = json.load(f)
+
+    with app.app_context():
+        db.engine.echo = False  # SQLALCHEMY_ECHO de la configuration de développement
+        start = time.perf_counter()
+        inserted = load_users(users, args.workers, args.fast_hash, args.chunk_size, verbose=True)
+        print(f"✅ {inserted} utilisateurs ajoutés en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,20 @@
+import json
+import os
 from typing import Any
 
-from flask import jsonify, request, session
+from flask import Response, current_app, jsonify, request, session, stream_with_context
 
 from src.api import api_bp
+from src.auth import availability
+from src.auth.passwords import get_hasher
+from src.auth.throttle import get_throttle
+from src.auth.utils import role_required
+from src.cart import orders as order_services
 from src.cart import services as cart_services
+from src.cart.checkout import CheckoutError, checkout
+from src.cart.stock import InsufficientStock
+from src.catalog.search import SEARCH_LIMIT_DEFAULT, search_products
 from src.models.product import Product
-from src.models.user import User
 
 
 @api_bp.route("/user/check", methods=["GET"])
@@ -17,19 +26,35 @@ def check_user() -> Any:
         if not username and not email:
             return jsonify({"error": "Veuillez fournir un username ou un email"}), 400
 
+        # Filtre de Bloom du worker : la base n'est interrogée que si la valeur est peut-être prise
         if username:
-            user = User.find_by_username(username)
-            return jsonify({"field": "username", "exists": user is not None, "value": username})
+            return jsonify(
+                {"field": "username", "exists": availability.username_exists(username), "value": username}
+            )
 
         if email:
-            user = User.find_by_email(email)
-            return jsonify({"field": "email", "exists": user is not None, "value": email})
+            return jsonify({"field": "email", "exists": availability.email_exists(email), "value": email})
 
         return jsonify({"error": "Paramètre invalide"}), 400
     except Exception as exc:
         return jsonify({"error": str(exc)}), 500
 
 
+@api_bp.route("/products/search", methods=["GET"])
+def search() -> Any:
+    try:
+        query = request.args.get("q", "").strip()
+        limit = request.args.get("limit", SEARCH_LIMIT_DEFAULT, type=int)
+
+        if not query:
+            return jsonify({"error": "Veuillez fournir un terme de recherche (q)"}), 400
+
+        hits = search_products(query, limit)
+        return jsonify({"query": query, "count": len(hits), "results": [hit.to_dict() for hit in hits]})
+    except Exception as exc:
+        return jsonify({"error": str(exc)}), 500
+
+
 @api_bp.route("/cart/add/<int:product_id>", methods=["POST", "GET"])
 def add_to_cart(product_id: int) -> Any:
     try:
@@ -76,23 +101,20 @@ def add_to_cart(product_id: int) -> Any:
                 404,
             )
 
-        cart = session.get("cart", {})
-        current_qty = int(cart.get(str(product_id), 0))
-
-        if current_qty + quantity > product.stock_quantity:
+        try:
+            cart_services.add_or_update_item(product_id, quantity, user_id)
+        except InsufficientStock as exc:
             return (
                 jsonify(
                     {
                         "error": "Stock insuffisant",
-                        "message": (f"Stock insuffisant. Disponible: " f"{product.stock_quantity}"),
-                        "available": product.stock_quantity,
+                        "message": str(exc),
+                        "available": exc.available,
                     }
                 ),
                 400,
             )
 
-        cart_services.add_or_update_item(product_id, quantity, user_id)
-
         return (
             jsonify(
                 {
@@ -112,9 +134,8 @@ def add_to_cart(product_id: int) -> Any:
 def remove_from_cart(product_id: int) -> Any:
     try:
         user_id = session.get("user_id")
-        cart = session.get("cart", {})
 
-        if str(product_id) not in cart:
+        if not cart_services.get_view(user_id).quantity_of(product_id):
             return (
                 jsonify(
                     {
@@ -188,19 +209,20 @@ def update_cart_quantity(product_id: int) -> Any:
                 404,
             )
 
-        if quantity > product.stock_quantity:
+        try:
+            cart_services.update_item_quantity(product_id, quantity, user_id)
+        except InsufficientStock as exc:
             return (
                 jsonify(
                     {
                         "error": "Stock insuffisant",
-                        "message": (f"Stock insuffisant. Disponible: " f"{product.stock_quantity}"),
+                        "message": str(exc),
+                        "available": exc.available,
                     }
                 ),
                 400,
             )
 
-        cart_services.update_item_quantity(product_id, quantity, user_id)
-
         return (
             jsonify(
                 {
@@ -219,19 +241,158 @@ def update_cart_quantity(product_id: int) -> Any:
 @api_bp.route("/cart/summary", methods=["GET"])
 def cart_summary() -> Any:
     try:
-        user_id = session.get("user_id")
+        cart = cart_services.get_view(session.get("user_id"))
 
         return (
             jsonify(
                 {
                     "success": True,
                     "message": "Résumé du panier",
-                    "cart_count": cart_services.get_count(user_id),
-                    "cart_total": round(cart_services.get_total(user_id), 2),
-                    "items": cart_services.get_items(user_id),
+                    "cart_count": cart.count,
+                    "cart_total": round(cart.total, 2),
+                    "items": cart.items,
+                }
+            ),
+            200,
+        )
+    except Exception as exc:
+        return jsonify({"error": str(exc), "message": "Erreur serveur"}), 500
+
+
+@api_bp.route("/cart/batch", methods=["POST"])
+def cart_batch() -> Any:
+    """
+    Applique plusieurs modifications du panier en un seul appel, tout ou rien.
+    Corps : {"operations": [{"op": "add" | "update" | "remove", "product_id": 1, "quantity": 2}, ...]}
+    """
+    try:
+        user_id = session.get("user_id")
+        payload = request.get_json(silent=True)
+        operations = payload.get("operations") if isinstance(payload, dict) else None
+
+        try:
+            cart = cart_services.apply_batch(operations, user_id)
+        except cart_services.CartOperationError as exc:
+            # Le panier n'a pas changé : on renvoie son état pour que la page se resynchronise
+            current = cart_services.get_view(user_id)
+            return (
+                jsonify(
+                    {
+                        **exc.to_dict(),
+                        "cart_count": current.count,
+                        "cart_total": round(current.total, 2),
+                        "items": current.items,
+                    }
+                ),
+                exc.status,
+            )
+
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "message": "Panier mis à jour",
+                    "cart_count": cart.count,
+                    "cart_total": round(cart.total, 2),
+                    "items": cart.items,
                 }
             ),
             200,
         )
     except Exception as exc:
         return jsonify({"error": str(exc), "message": "Erreur serveur"}), 500
+
+
+@api_bp.route("/cart/checkout", methods=["POST"])
+def cart_checkout() -> Any:
+    """
+    Valide le panier de l'utilisateur connecté. L'en-tête Idempotency-Key (ou le champ
+    idempotency_key du corps JSON) permet de renvoyer la requête sans créer de doublon.
+    """
+    try:
+        user_id = session.get("user_id")
+        if user_id is None:
+            return (
+                jsonify({"error": "Authentification requise", "message": "Connectez-vous pour commander"}),
+                401,
+            )
+
+        payload = request.get_json(silent=True)
+        idempotency_key = request.headers.get("Idempotency-Key") or (
+            payload.get("idempotency_key") if isinstance(payload, dict) else None
+        )
+
+        try:
+            result = checkout(user_id, idempotency_key)
+        except CheckoutError as exc:
+            return jsonify(exc.to_dict()), exc.status
+
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "message": "Commande validée",
+                    "replayed": result.replayed,
+                    "order": result.order.to_dict(),
+                }
+            ),
+            200 if result.replayed else 201,
+        )
+    except Exception as exc:
+        return jsonify({"error": str(exc), "message": "Erreur serveur"}), 500
+
+
+@api_bp.route("/orders", methods=["GET"])
+def order_history() -> Any:
+    """Historique des commandes de l'utilisateur connecté : ?limit=20&cursor=<next_cursor>"""
+    try:
+        user_id = session.get("user_id")
+        if user_id is None:
+            return (
+                jsonify(
+                    {"error": "Authentification requise", "message": "Connectez-vous pour voir vos commandes"}
+                ),
+                401,
+            )
+
+        limit = request.args.get("limit", order_services.ORDER_PAGE_SIZE_DEFAULT, type=int)
+        try:
+            page = order_services.user_orders(user_id, limit, request.args.get("cursor"))
+        except ValueError as exc:
+            return jsonify({"error": str(exc), "message": "Requête invalide"}), 400
+
+        return jsonify({"success": True, "orders": page.orders, "next_cursor": page.next_cursor}), 200
+    except Exception as exc:
+        return jsonify({"error": str(exc), "message": "Erreur serveur"}), 500
+
+
+@api_bp.route("/admin/orders", methods=["GET"])
+@role_required("admin", "gerant")
+def admin_orders() -> Response:
+    """
+    Export de toutes les commandes (?status= pour n'en garder qu'un statut), une commande JSON par
+    ligne (NDJSON).
+    La réponse est produite au fil de la lecture : rien n'est chargé en entier en mémoire.
+    """
+    status = request.args.get("status") or None
+
+    def generate() -> Any:
+        for order in order_services.iter_orders(status):
+            yield json.dumps(order) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@api_bp.route("/admin/metrics", methods=["GET"])
+@role_required("admin")
+def admin_metrics() -> Any:
+    """Compteurs de ce worker : hachage des mots de passe, limitation des connexions, cache de fragments."""
+    return jsonify(
+        {
+            "worker_pid": os.getpid(),
+            "password_hashing": get_hasher().stats(),
+            "login_throttle": get_throttle().stats(),
+            "user_check_filter": availability.stats(),
+            "fragment_cache": current_app.jinja_env.fragment_cache.stats(),  # type: ignore[attr-defined]
+        }
+    )
@@ -0,0 +1,6 @@
+from flask import Blueprint
+
+assets_bp = Blueprint("assets", __name__)
+
+
+from src.assets import routes  # noqa: E402, F401
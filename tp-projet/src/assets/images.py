@@ -0,0 +1,251 @@
+"""
+Déclinaisons des images produits (miniature, carte, fiche) en JPEG et WebP.
+
+La génération se fait hors ligne (python build_assets.py images) et de façon incrémentale :
+seules les images sources dont le contenu a changé depuis le dernier passage sont retraitées,
+en parallèle dans un pool de processus. Chaque fichier produit porte l'empreinte de son contenu
+dans son nom (fion-vendeen-card-1a2b3c4d.webp), ce qui permet de le servir avec un cache
+navigateur d'un an (voir src/assets/routes.py).
+
+Le manifeste images.json fait le lien entre une image source et ses déclinaisons. Les templates
+l'utilisent via product_picture() pour produire un <picture> avec srcset et loading="lazy" ;
+tant qu'une image n'a pas été traitée, l'original de static/img/products est utilisé.
+
+Les déclinaisons remplacées par un nouveau passage ne sont pas supprimées tout de suite : des
+pages encore en cache (fragments, réponses 304) peuvent y faire référence. Elles sont notées
+dans la section "retired" du manifeste avec leur date de retrait, et supprimées par
+collect_images() (python build_assets.py gc) une fois le délai de grâce écoulé.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Iterable
+
+from flask import url_for
+from markupsafe import Markup, escape
+
+from src.assets.manifest import get_manifest, write_manifest
+
+MANIFEST_NAME = "images.json"
+OUTPUT_SUBDIR = "img"
+
+# Largeurs (en pixels) de chaque déclinaison
+IMAGE_SIZES: dict[str, int] = {
+    "thumb": 120,
+    "card": 400,
+    "detail": 900,
+}
+
+# Format -> (format Pillow, options d'enregistrement)
+IMAGE_FORMATS: dict[str, tuple[str, dict[str, Any]]] = {
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+}
+
+# Largeur d'affichage par défaut des images dans les pages (attribut sizes)
+DEFAULT_SIZES_ATTR = "(max-width: 600px) 100vw, 400px"
+
+
+@dataclass
+class BuildReport:
+    """Résumé d'un passage du pipeline."""
+
+    processed: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)
+    retired: list[str] = field(default_factory=list)
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _render_variants(source_path: str, output_dir: str) -> dict[str, dict[str, Any]]:
+    """
+    Produit toutes les déclinaisons d'une image. Exécutée dans un processus du pool :
+    la fonction est au niveau du module pour pouvoir être envoyée aux processus fils.
+    """
+    from PIL import Image  # dépendance optionnelle (groupe "assets")
+
+    stem = Path(source_path).stem
+    variants: dict[str, dict[str, Any]] = {}
+    by_width: dict[int, dict[str, Any]] = {}
+    with Image.open(source_path) as original:
+        image = original.convert("RGB")
+        for size_name, width in IMAGE_SIZES.items():
+            # On ne grossit jamais une image plus petite que la largeur demandée : si deux tailles
+            # retombent sur la même largeur, elles partagent les mêmes fichiers
+            target_width = min(width, image.width)
+            if target_width in by_width:
+                variants[size_name] = by_width[target_width]
+                continue
+            target_height = max(1, round(image.height * target_width / image.width))
+            resized = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+            variant: dict[str, Any] = {"width": target_width, "height": target_height}
+            for ext, (pil_format, options) in IMAGE_FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, pil_format, **options)
+                data = buffer.getvalue()
+                name = f"{stem}-{size_name}-{hashlib.sha256(data).hexdigest()[:8]}.{ext}"
+                with open(os.path.join(output_dir, name), "wb") as out:
+                    out.write(data)
+                variant[ext] = f"{OUTPUT_SUBDIR}/{name}"
+            variants[size_name] = by_width[target_width] = variant
+    return variants
+
+
+def _variant_files(entry: dict[str, Any]) -> set[str]:
+    return {
+        path
+        for variant in entry.get("variants", {}).values()
+        for ext, path in variant.items()
+        if ext in IMAGE_FORMATS
+    }
+
+
+def _load_manifest(manifest_path: Path) -> dict[str, Any]:
+    manifest: dict[str, Any] = {"images": {}, "retired": {}}
+    if manifest_path.exists():
+        manifest.update(json.loads(manifest_path.read_text(encoding="utf-8")))
+    return manifest
+
+
+def build_images(
+    names: Iterable[str],
+    source_dir: Path,
+    build_dir: Path,
+    workers: int | None = None,
+    force: bool = False,
+) -> BuildReport:
+    """
+    Génère les déclinaisons des images listées (noms de fichiers relatifs à source_dir).
+    Une image est ignorée si son empreinte SHA-256 n'a pas changé et que ses fichiers existent.
+    """
+    output_dir = build_dir / OUTPUT_SUBDIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = build_dir / MANIFEST_NAME
+    manifest = _load_manifest(manifest_path)
+    entries: dict[str, Any] = manifest["images"]
+    # Fichier retiré -> date du retrait (secondes depuis l'epoch)
+    retired: dict[str, float] = manifest.setdefault("retired", {})
+
+    report = BuildReport()
+    todo: dict[str, str] = {}
+    for name in sorted(set(names)):
+        source = source_dir / name
+        if not source.is_file():
+            report.missing.append(name)
+            continue
+        source_hash = _file_hash(source)
+        entry = entries.get(name)
+        up_to_date = (
+            entry is not None
+            and entry.get("source") == source_hash
+            and all((build_dir / path).exists() for path in _variant_files(entry))
+        )
+        if up_to_date and not force:
+            report.skipped.append(name)
+        else:
+            todo[name] = source_hash
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                name: pool.submit(_render_variants, str(source_dir / name), str(output_dir)) for name in todo
+            }
+            for name, future in futures.items():
+                try:
+                    variants = future.result()
+                except Exception as e:
+                    report.failed[name] = str(e)
+                    continue
+                old_files = _variant_files(entries.get(name, {}))
+                entries[name] = {"source": todo[name], "variants": variants}
+                new_files = _variant_files(entries[name])
+                # Les anciennes déclinaisons sont gardées jusqu'au passage de collect_images()
+                for stale in old_files - new_files:
+                    retired.setdefault(stale, time.time())
+                    report.retired.append(stale)
+                # Image revenue à un contenu déjà produit : ses fichiers ne sont plus à supprimer
+                for path in new_files:
+                    retired.pop(path, None)
+                report.processed.append(name)
+
+    write_manifest(manifest_path, manifest)
+    return report
+
+
+def collect_images(build_dir: Path, grace_seconds: float) -> list[str]:
+    """
+    Supprime les déclinaisons retirées depuis plus de grace_seconds secondes et qu'aucune image
+    du manifeste n'utilise plus. Retourne les chemins supprimés (relatifs à build_dir).
+    """
+    manifest_path = build_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return []
+    manifest = _load_manifest(manifest_path)
+    retired: dict[str, float] = manifest["retired"]
+    in_use = {path for entry in manifest["images"].values() for path in _variant_files(entry)}
+    deadline = time.time() - grace_seconds
+    deleted = []
+    for path, retired_at in list(retired.items()):
+        if path in in_use:
+            del retired[path]
+        elif retired_at <= deadline:
+            (build_dir / path).unlink(missing_ok=True)
+            del retired[path]
+            deleted.append(path)
+    write_manifest(manifest_path, manifest)
+    return deleted
+
+
+def _srcset(variants: dict[str, Any], ext: str) -> str:
+    widths = {variant["width"]: variant[ext] for variant in variants.values()}
+    return ", ".join(
+        f"{url_for('assets.asset', filename=path)} {width}w" for width, path in sorted(widths.items())
+    )
+
+
+def product_picture(
+    name: str | None,
+    alt: str,
+    size: str = "card",
+    sizes: str = DEFAULT_SIZES_ATTR,
+    lazy: bool = True,
+    css_class: str | None = None,
+) -> Markup:
+    """
+    Balise <picture> d'une image produit : source WebP + repli JPEG, srcset de toutes les largeurs.
+    Utilise l'image d'origine si elle n'a pas encore été déclinée par le pipeline.
+    """
+    if not name:
+        return Markup("")
+    attrs = Markup(' loading="lazy" decoding="async"') if lazy else Markup("")
+    if css_class:
+        attrs += Markup(' class="{}"').format(css_class)
+    entry = get_manifest(MANIFEST_NAME, "images").get(name)
+    variants = entry["variants"] if entry else None
+    if not variants or size not in variants:
+        src = url_for("static", filename=f"img/products/{name}")
+        return Markup(f'<img src="{src}" alt="{escape(alt)}"{attrs}>')
+
+    default = variants[size]
+    return Markup(
+        f'<picture>'
+        f'<source type="image/webp" srcset="{_srcset(variants, "webp")}" sizes="{escape(sizes)}">'
+        f'<img src="{url_for("assets.asset", filename=default["jpg"])}" srcset="{_srcset(variants, "jpg")}" '
+        f'sizes="{escape(sizes)}" width="{default["width"]}" height="{default["height"]}" '
+        f'alt="{escape(alt)}"{attrs}>'
+        f'</picture>'
+    )
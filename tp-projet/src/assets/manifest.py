@@ -0,0 +1,71 @@
+"""
+Lecture des manifestes JSON produits par build_assets.py.
+
+Chaque worker garde le manifeste en mémoire et ne le relit que lorsque le fichier a été remplacé
+(nouveau build), ce qui évite un accès disque à chaque url_for.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from flask import current_app
+
+
+class Manifest:
+    """Section d'un manifeste JSON, rechargée automatiquement quand le fichier change."""
+
+    def __init__(self, path: Path, section: str) -> None:
+        self.path = path
+        self.section = section
+        self._mtime: int | None = None
+        self._entries: dict[str, Any] = {}
+
+    def get(self, name: str) -> Any:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            self._entries = json.loads(self.path.read_text(encoding="utf-8")).get(self.section, {})
+            self._mtime = mtime
+        return self._entries.get(name)
+
+
+def get_manifest(file_name: str, section: str) -> Manifest:
+    """Manifeste file_name du dossier ASSET_BUILD_DIR de l'application courante."""
+    key = f"manifest:{file_name}"
+    manifest = current_app.extensions.get(key)
+    if manifest is None:
+        manifest = Manifest(Path(current_app.config["ASSET_BUILD_DIR"]) / file_name, section)
+        current_app.extensions[key] = manifest
+    return manifest
+
+
+def assets_version() -> str:
+    """
+    Version des ressources générées : empreinte des dates de modification des manifestes de
+    ASSET_BUILD_DIR, qui change à chaque build. Les pages et fragments en cache qui contiennent des
+    URL à empreinte en dépendent (ETag, clés du cache de fragments). Chaîne vide sans build.
+    """
+    try:
+        with os.scandir(current_app.config["ASSET_BUILD_DIR"]) as entries:
+            stamps = sorted(
+                (entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.name.endswith(".json")
+            )
+    except OSError:
+        return ""
+    if not stamps:
+        return ""
+    return hashlib.blake2b(repr(stamps).encode(), digest_size=8).hexdigest()
+
+
+def write_manifest(path: Path, data: dict[str, Any]) -> None:
+    """Écrit le manifeste de façon atomique : un worker ne lit jamais un fichier à moitié écrit."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -0,0 +1,47 @@
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory
+from werkzeug.wrappers import Response
+
+from src.assets import assets_bp
+
+# Les fichiers générés ont un nom qui contient l'empreinte de leur contenu : ils ne changent jamais,
+# le navigateur peut les garder un an sans jamais les revalider
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Variantes précompressées écrites par build_assets.py, par ordre de préférence
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json"}
+
+
+def _precompressed(directory: str, filename: str) -> tuple[str, str] | None:
+    """(encodage, fichier) de la meilleure variante précompressée acceptée par le client."""
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(directory, filename + suffix)):
+            return encoding, filename + suffix
+    return None
+
+
+@assets_bp.route("/<path:filename>")
+def asset(filename: str) -> Response:
+    directory = current_app.config["ASSET_BUILD_DIR"]
+    compressible = os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS
+    variant = _precompressed(directory, filename) if compressible else None
+
+    if variant is None:
+        response = send_from_directory(directory, filename, max_age=IMMUTABLE_MAX_AGE)
+    else:
+        encoding, compressed_name = variant
+        response = send_from_directory(
+            directory,
+            compressed_name,
+            max_age=IMMUTABLE_MAX_AGE,
+            mimetype=mimetypes.guess_type(filename)[0],
+        )
+        response.content_encoding = encoding
+    if compressible:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,170 @@
+"""
+Empreinte de contenu des fichiers statiques (CSS, JS, SVG) et variantes précompressées.
+
+python build_assets.py static copie chaque fichier de static/ dans ASSET_BUILD_DIR/static sous un
+nom qui contient l'empreinte de son contenu (css/style.3f2a9c1e.css), avec à côté une version
+gzip (.gz) et, si le module brotli est installé, une version brotli (.br). Le manifeste static.json
+associe le chemin d'origine au chemin généré.
+
+Dans les templates, url_for('static', filename='css/style.css') est redirigé vers /assets/...
+quand le fichier figure dans le manifeste : l'URL change à chaque modification du fichier, le
+navigateur peut donc le garder en cache indéfiniment. Sans build, l'URL /static/... d'origine
+est conservée.
+
+Comme pour les images, une version remplacée reste servie un moment : elle est notée dans la
+section "retired" du manifeste, et supprimée par collect_static() (python build_assets.py gc)
+une fois le délai de grâce écoulé.
+"""
+
+import gzip
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from flask import url_for
+
+from src.assets.manifest import get_manifest, write_manifest
+
+MANIFEST_NAME = "static.json"
+OUTPUT_SUBDIR = "static"
+
+# Extensions prises en charge par l'empreinte (les photos produits passent par images.py) ;
+# ce sont des formats texte, ils ont tous une version .gz (et .br)
+FINGERPRINT_EXTENSIONS = {".css", ".js", ".svg"}
+# Sous-dossiers de static/ ignorés : sortie du build et photos produits
+EXCLUDED_DIRS = {"build", "products"}
+# Versions précompressées écrites à côté de chaque fichier
+COMPRESSED_SUFFIXES = (".gz", ".br")
+
+
+def _brotli_compress() -> Callable[[bytes], bytes] | None:
+    try:
+        import brotli  # dépendance optionnelle (groupe "assets")
+    except ImportError:
+        return None
+    return lambda data: brotli.compress(data, quality=11)
+
+
+@dataclass
+class StaticReport:
+    """Résumé d'un passage du build des fichiers statiques."""
+
+    processed: list[str] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    brotli: bool = False
+
+
+def _fingerprinted_name(relative: Path, digest: str) -> str:
+    return (relative.parent / f"{relative.stem}.{digest[:8]}{relative.suffix}").as_posix()
+
+
+def _load_manifest(manifest_path: Path) -> dict[str, Any]:
+    manifest: dict[str, Any] = {"files": {}, "retired": {}}
+    if manifest_path.exists():
+        manifest.update(json.loads(manifest_path.read_text(encoding="utf-8")))
+    return manifest
+
+
+def build_static(static_dir: Path, build_dir: Path) -> StaticReport:
+    """
+    Copie les fichiers statiques sous un nom à empreinte et écrit leurs versions .gz / .br.
+    Les versions précédentes sont conservées jusqu'à collect_static() : des pages encore en cache
+    (fragments, 304) peuvent toujours y faire référence.
+    """
+    output_dir = build_dir / OUTPUT_SUBDIR
+    manifest_path = build_dir / MANIFEST_NAME
+    previous = _load_manifest(manifest_path)
+    compress_br = _brotli_compress()
+    report = StaticReport(brotli=compress_br is not None)
+    files: dict[str, str] = {}
+    for source in sorted(static_dir.rglob("*")):
+        relative = source.relative_to(static_dir)
+        if (
+            not source.is_file()
+            or source.suffix not in FINGERPRINT_EXTENSIONS
+            or EXCLUDED_DIRS.intersection(relative.parts)
+        ):
+            continue
+        data = source.read_bytes()
+        name = relative.as_posix()
+        target_name = _fingerprinted_name(relative, hashlib.sha256(data).hexdigest())
+        target = output_dir / target_name
+        files[name] = f"{OUTPUT_SUBDIR}/{target_name}"
+
+        wanted = [target, target.with_name(target.name + ".gz")]
+        if compress_br is not None:
+            wanted.append(target.with_name(target.name + ".br"))
+        if all(path.exists() for path in wanted):
+            report.skipped.append(name)
+            continue
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        # mtime=0 : même contenu => même fichier .gz, quel que soit le moment du build
+        target.with_name(target.name + ".gz").write_bytes(gzip.compress(data, 9, mtime=0))
+        if compress_br is not None:
+            target.with_name(target.name + ".br").write_bytes(compress_br(data))
+        report.processed.append(name)
+
+    # Fichier retiré -> date du retrait (secondes depuis l'epoch)
+    retired: dict[str, float] = previous["retired"]
+    for path in set(previous["files"].values()) - set(files.values()):
+        retired.setdefault(path, time.time())
+    for path in files.values():
+        retired.pop(path, None)
+
+    build_dir.mkdir(parents=True, exist_ok=True)
+    write_manifest(manifest_path, {"files": files, "retired": retired})
+    return report
+
+
+def collect_static(build_dir: Path, grace_seconds: float) -> list[str]:
+    """
+    Supprime les versions (et leurs .gz / .br) retirées du manifeste depuis plus de grace_seconds
+    secondes. Un fichier inconnu du manifeste (build antérieur) est noté comme retiré maintenant.
+    Retourne les chemins supprimés (relatifs à build_dir).
+    """
+    manifest_path = build_dir / MANIFEST_NAME
+    output_dir = build_dir / OUTPUT_SUBDIR
+    if not manifest_path.exists() or not output_dir.is_dir():
+        return []
+    manifest = _load_manifest(manifest_path)
+    in_use = set(manifest["files"].values())
+    retired: dict[str, float] = manifest["retired"]
+    now = time.time()
+    deleted = []
+    for path in sorted(output_dir.rglob("*")):
+        if not path.is_file():
+            continue
+        relative = path.relative_to(build_dir).as_posix()
+        version = relative.removesuffix(".gz").removesuffix(".br")
+        if version in in_use:
+            continue
+        retired_at = retired.setdefault(version, now)
+        if retired_at <= now - grace_seconds:
+            path.unlink(missing_ok=True)
+            deleted.append(relative)
+    # Oublie les versions dont tous les fichiers ont disparu
+    for version in list(retired):
+        if version in in_use or not any(
+            (build_dir / (version + suffix)).exists() for suffix in ("", *COMPRESSED_SUFFIXES)
+        ):
+            del retired[version]
+    write_manifest(manifest_path, manifest)
+    return deleted
+
+
+def asset_url_for(endpoint: str, **values: Any) -> str:
+    """
+    Remplace url_for dans les templates : les fichiers statiques présents dans le manifeste
+    pointent vers leur version à empreinte, servie avec un cache immuable.
+    """
+    if endpoint == "static" and "filename" in values:
+        fingerprinted = get_manifest(MANIFEST_NAME, "files").get(values["filename"])
+        if fingerprinted is not None:
+            values["filename"] = fingerprinted
+            return url_for("assets.asset", **values)
+    return url_for(endpoint, **values)
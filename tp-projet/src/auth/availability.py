@@ -0,0 +1,223 @@
+"""
+Disponibilité des identifiants et emails (/api/user/check) sans requête SQL dans le cas courant.
+
+Le formulaire d'inscription interroge /api/user/check à chaque frappe, presque toujours pour un
+identifiant libre. Chaque worker garde un filtre de Bloom des usernames et des emails (en
+minuscules) : un filtre qui ne contient pas la valeur répond « libre » à coup sûr, sans aller en
+base. Seul un résultat « peut-être pris » (pris réellement, ou faux positif dans ~1 % des cas)
+est vérifié par une requête indexée.
+
+Le filtre est construit au premier appel, puis tenu à jour par deux fichiers témoins
+(src/services/stamp.py) remplacés au commit, dont chaque worker compare l'identité (un os.stat) :
+
+- USERS_STAMP_FILE : des utilisateurs ont été créés. Le worker ajoute à son filtre ceux dont l'id
+  dépasse le plus grand id déjà ajouté, en une requête indexée ; il ne reconstruit le filtre que
+  si sa capacité est dépassée. SQLite n'a qu'un écrivain à la fois : les ids sont validés dans
+  l'ordre croissant, aucun n'est sauté ;
+- USERS_REBUILD_STAMP_FILE : un identifiant ou un email a changé (profil), ou la table a été
+  modifiée en masse. Le worker reconstruit son filtre. Les autres modifications du profil
+  (mot de passe, adresse...) ne préviennent personne.
+"""
+
+import hashlib
+import math
+import threading
+from typing import Any
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import InstanceState, Session
+
+from src.models.database import db
+from src.models.user import User
+from src.services.stamp import Stamp, read_stamp, touch_stamp
+
+# Capacité minimale, et marge pour les inscriptions à venir avant reconstruction
+BLOOM_MIN_CAPACITY = 1024
+BLOOM_GROWTH = 2
+
+# Clé posée dans session.info par la transaction en cours : "added" (créations) ou "rebuild"
+_CHANGED_KEY = "users_changed"
+_STAMP_KEY = "USERS_STAMP_FILE"
+_REBUILD_STAMP_KEY = "USERS_REBUILD_STAMP_FILE"
+
+
+class BloomFilter:
+    """Filtre de Bloom dans un bytearray ; positions par double hachage (blake2b 128 bits)."""
+
+    def __init__(self, capacity: int, false_positive_rate: float) -> None:
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str) -> list[int]:
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+
+class UserFilters:
+    """
+    Filtres des usernames et des emails d'un worker, avec l'identité des témoins lors de la dernière
+    mise à jour et le plus grand id d'utilisateur ajouté.
+    """
+
+    def __init__(
+        self, stamp: Stamp | None, rebuild_stamp: Stamp | None, capacity: int, false_positive_rate: float
+    ) -> None:
+        self.stamp = stamp
+        self.rebuild_stamp = rebuild_stamp
+        self.last_id = 0
+        self.usernames = BloomFilter(capacity, false_positive_rate)
+        self.emails = BloomFilter(capacity, false_positive_rate)
+
+    def add(self, username: str, email: str) -> None:
+        self.usernames.add(username)
+        self.emails.add(email.lower())
+
+
+_filters: UserFilters | None = None
+_lock = threading.Lock()
+_stats = {"definitely_free": 0, "db_lookups": 0, "rebuilds": 0, "updates": 0}
+
+
+def _build_filters(stamp: Stamp | None, rebuild_stamp: Stamp | None) -> UserFilters:
+    rate = current_app.config["USER_BLOOM_FALSE_POSITIVE_RATE"]
+    count = db.session.scalar(db.select(db.func.count(User.id))) or 0
+    filters = UserFilters(stamp, rebuild_stamp, max(BLOOM_MIN_CAPACITY, count * BLOOM_GROWTH), rate)
+    rows = db.session.execute(
+        db.select(User.id, User.username, User.email).execution_options(yield_per=1000)
+    )
+    for user_id, username, email in rows:
+        filters.add(username, email)
+        filters.last_id = max(filters.last_id, user_id)
+    _stats["rebuilds"] += 1
+    return filters
+
+
+def _add_new_users(filters: UserFilters) -> bool:
+    """Ajoute au filtre les utilisateurs créés depuis sa dernière mise à jour. False s'il est plein."""
+    rows = db.session.execute(
+        db.select(User.id, User.username, User.email).where(User.id > filters.last_id).order_by(User.id)
+    ).all()
+    for user_id, username, email in rows:
+        filters.add(username, email)
+        filters.last_id = user_id
+    _stats["updates"] += 1
+    return not filters.usernames.full
+
+
+def _get_filters() -> UserFilters:
+    global _filters
+    # Témoins lus AVANT les requêtes : un commit concurrent sera vu au prochain appel
+    stamp = read_stamp(_STAMP_KEY)
+    rebuild_stamp = read_stamp(_REBUILD_STAMP_KEY)
+    filters = _filters
+    if filters is not None and filters.stamp == stamp and filters.rebuild_stamp == rebuild_stamp:
+        return filters
+    with _lock:
+        filters = _filters
+        if filters is None or filters.rebuild_stamp != rebuild_stamp:
+            filters = _build_filters(stamp, rebuild_stamp)
+        elif filters.stamp != stamp:
+            # Les lecteurs concurrents voient le filtre pendant l'ajout : au pire un faux positif
+            if not _add_new_users(filters):
+                filters = _build_filters(stamp, rebuild_stamp)
+            filters.stamp = stamp
+        _filters = filters
+        return filters
+
+
+def username_exists(username: str) -> bool:
+    if username not in _get_filters().usernames:
+        _stats["definitely_free"] += 1
+        return False
+    _stats["db_lookups"] += 1
+    return User.find_by_username(username) is not None
+
+
+def email_exists(email: str) -> bool:
+    if email.lower() not in _get_filters().emails:
+        _stats["definitely_free"] += 1
+        return False
+    _stats["db_lookups"] += 1
+    return User.find_by_email(email) is not None
+
+
+def stats() -> dict:
+    filters = _filters
+    return {
+        **_stats,
+        "entries": filters.usernames.count if filters else 0,
+        "capacity": filters.usernames.capacity if filters else 0,
+    }
+
+
+# --- Mise à jour des filtres ---
+
+
+@event.listens_for(User, "after_insert")
+def _flag_added_user(mapper: Any, connection: Any, user: User) -> None:
+    session = Session.object_session(user)
+    if session is not None:
+        # Sans écraser un "rebuild" déjà posé dans la même transaction
+        session.info.setdefault(_CHANGED_KEY, "added")
+
+
+@event.listens_for(User, "after_update")
+def _flag_renamed_user(mapper: Any, connection: Any, user: User) -> None:
+    # Seuls l'identifiant et l'email sont dans les filtres. L'ancienne valeur reste un simple faux
+    # positif jusqu'à la reconstruction
+    state: InstanceState[User] = inspect(user)
+    if not (state.attrs.username.history.has_changes() or state.attrs.email.history.has_changes()):
+        return
+    session = Session.object_session(user)
+    if session is not None:
+        session.info[_CHANGED_KEY] = "rebuild"
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_changes(orm_execute_state: Any) -> None:
+    """
+    INSERT en masse sur users (imports) : ajout aux filtres comme une création.
+    UPDATE en masse : les colonnes modifiées ne sont pas examinées, les filtres sont reconstruits.
+    """
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if getattr(table, "name", None) != User.__tablename__:
+        return
+    if orm_execute_state.is_update:
+        orm_execute_state.session.info[_CHANGED_KEY] = "rebuild"
+    else:
+        orm_execute_state.session.info.setdefault(_CHANGED_KEY, "added")
+
+
+@event.listens_for(Session, "after_commit")
+def _signal_on_commit(session: Session) -> None:
+    # Tous les workers, celui-ci compris, mettent leur filtre à jour au prochain appel
+    changed = session.info.pop(_CHANGED_KEY, None)
+    if changed == "rebuild":
+        touch_stamp(_REBUILD_STAMP_KEY)
+    elif changed == "added":
+        touch_stamp(_STAMP_KEY)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,178 @@
+"""
+Hachage des mots de passe borné pour l'ensemble des workers HTTP.
+
+Un appel scrypt ou pbkdf2 occupe un cœur plusieurs dizaines de millisecondes. Les workers
+gunicorn sont synchrones : un worker qui attend un calcul est bloqué, qu'il le fasse lui-même ou
+qu'il attende un autre processus. Ce qui protège les pages du catalogue, c'est donc de borner le
+nombre de calculs simultanés sur la machine, pour qu'il reste toujours des cœurs aux autres
+workers. Chaque calcul prend l'un des PASSWORD_HASH_SLOTS créneaux partagés par tous les workers
+(un fichier verrou par créneau, verrouillé avec flock) et le garde jusqu'à la fin du calcul. Si
+aucun créneau n'est libre, PasswordHashingBusy est levée avant tout calcul et la route répond 503
+avec un en-tête Retry-After. Un verrou est libéré par le système à la mort du processus qui le
+tient : un créneau ne peut pas être perdu.
+
+Le coût du hachage (PASSWORD_HASH_METHOD) est réglé par environnement dans config.py. Les
+empreintes existantes restent vérifiables : la méthode est inscrite dans chacune.
+"""
+
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, cast
+
+from flask import Flask, current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de flock, les créneaux sont comptés par processus
+    fcntl = None  # type: ignore[assignment]
+
+
+class PasswordHashingBusy(Exception):
+    """Tous les créneaux de hachage sont occupés ; le client doit réessayer après retry_after secondes."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Service de hachage saturé")
+        self.retry_after = retry_after
+
+
+class HashSlots:
+    """Créneaux de calcul partagés par les processus : slot-<n>.lock dans directory, un verrou par créneau."""
+
+    def __init__(self, directory: str, count: int) -> None:
+        self.count = count
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.paths = [os.path.join(directory, f"slot-{n}.lock") for n in range(count)]
+        self._local = threading.BoundedSemaphore(count) if fcntl is None else None
+
+    def acquire(self) -> int | None:
+        """Prend un créneau libre sans attendre : descripteur du verrou obtenu, None si tous sont pris."""
+        if self._local is not None:
+            return 0 if self._local.acquire(blocking=False) else None
+        # Départ au hasard : les workers n'essaient pas tous les créneaux dans le même ordre
+        start = random.randrange(self.count)
+        for path in self.paths[start:] + self.paths[:start]:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def release(self, fd: int) -> None:
+        if self._local is not None:
+            self._local.release()
+            return
+        # Fermer le descripteur libère le verrou
+        os.close(fd)
+
+
+class HashMetrics:
+    """Compteurs et durées des calculs de hachage de ce worker, pour le suivi."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.compute_seconds = 0.0
+        self.max_compute_seconds = 0.0
+
+    def started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, compute: float | None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            if compute is None:
+                # Erreur du calcul
+                self.failed += 1
+                return
+            self.completed += 1
+            self.compute_seconds += compute
+            self.max_compute_seconds = max(self.max_compute_seconds, compute)
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.completed
+            return {
+                "completed": done,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "in_flight": self.in_flight,
+                "avg_compute_ms": round(self.compute_seconds / done * 1000, 2) if done else None,
+                "max_compute_ms": round(self.max_compute_seconds * 1000, 2),
+            }
+
+
+class PasswordHasher:
+    """Calcule les empreintes dans le processus appelant, dans la limite des créneaux partagés."""
+
+    def __init__(self, slots: HashSlots, retry_after: int) -> None:
+        self.slots = slots
+        self.retry_after = retry_after
+        self.metrics = HashMetrics()
+
+    def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Exécute func(*args) dans un créneau. Lève PasswordHashingBusy si aucun n'est libre."""
+        slot = self.slots.acquire()
+        if slot is None:
+            self.metrics.reject()
+            raise PasswordHashingBusy(self.retry_after)
+        self.metrics.started()
+        compute = None
+        try:
+            start = time.perf_counter()
+            result = func(*args)
+            compute = time.perf_counter() - start
+            return result
+        finally:
+            # Le créneau n'est rendu qu'une fois le calcul terminé
+            self.slots.release(slot)
+            self.metrics.finished(compute)
+
+    def hash(self, password: str, method: str, salt_length: int) -> str:
+        return str(self.run(generate_password_hash, password, method, salt_length))
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return bool(self.run(check_password_hash, pwhash, password))
+
+    def stats(self) -> dict:
+        return {"slots": self.slots.count, **self.metrics.stats()}
+
+
+def init_password_hasher(app: Flask) -> None:
+    """Crée le hacheur de l'application à partir de sa configuration."""
+    config = app.config
+    slots = config["PASSWORD_HASH_SLOTS"]
+    if slots is None:
+        # La moitié des cœurs : l'autre reste aux pages pendant une rafale de connexions
+        slots = max(1, (os.cpu_count() or 1) // 2)
+    app.extensions["password_hasher"] = PasswordHasher(
+        HashSlots(config["PASSWORD_HASH_SLOT_DIR"], slots), retry_after=config["PASSWORD_HASH_RETRY_AFTER"]
+    )
+
+
+def get_hasher() -> PasswordHasher:
+    return cast(PasswordHasher, current_app.extensions["password_hasher"])
+
+
+def hash_password(password: str) -> str:
+    """Empreinte du mot de passe avec la méthode configurée (PASSWORD_HASH_METHOD)."""
+    config = current_app.config
+    return get_hasher().hash(password, config["PASSWORD_HASH_METHOD"], config["PASSWORD_HASH_SALT_LENGTH"])
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    return get_hasher().verify(pwhash, password)
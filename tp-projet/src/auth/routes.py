@@ -1,15 +1,17 @@
 import re
 from typing import Any
 
-from flask import flash, jsonify, redirect, render_template, request, session, url_for
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import flash, jsonify, make_response, redirect, render_template, request, session, url_for
 from werkzeug.wrappers import Response
 
 from src.auth import auth_bp
-from src.auth.utils import get_current_user, login_required
+from src.auth.passwords import PasswordHashingBusy, hash_password, verify_password
+from src.auth.throttle import LoginThrottled, get_throttle
+from src.auth.utils import forget_identity, get_current_user, login_required
 from src.cart import services as cart_services
 from src.models.database import db
 from src.models.user import User
+from src.services.session_store import regenerate_session
 
 
 def validate_required_fields(form: dict[str, str]) -> str | None:
@@ -130,6 +132,24 @@ def validate_registration(form: dict[str, str]) -> str | None:
     return None
 
 
+@auth_bp.errorhandler(PasswordHashingBusy)
+def hashing_busy(exc: PasswordHashingBusy) -> Response:
+    """Trop de connexions/inscriptions simultanées : le client réessaie un peu plus tard."""
+    flash("Trop de demandes en cours, veuillez réessayer dans quelques secondes", "error")
+    template = "register.html" if request.endpoint == "auth.register" else "auth/login.html"
+    response = make_response(render_template(template), 503)
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+@auth_bp.errorhandler(LoginThrottled)
+def login_throttled(exc: LoginThrottled) -> Response:
+    flash("Trop de tentatives de connexion, veuillez patienter avant de réessayer", "error")
+    response = make_response(render_template("auth/login.html"), 429)
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login() -> str | Response:
     if request.method == "POST":
@@ -140,12 +160,18 @@ def login() -> str | Response:
             flash("Veuillez remplir tous les champs", "error")
             return render_template("auth/login.html")
 
+        # Avant toute requête et tout hachage : une rafale de tentatives ne coûte presque rien
+        get_throttle().hit(request.remote_addr, username_input)
+
         user = User.find_by_username(username_input)
 
-        if user and check_password_hash(user.password, password_input):
+        if user and verify_password(user.password, password_input):
+            # Nouvel identifiant de session : celui d'avant la connexion a pu être fixé par un tiers
+            regenerate_session()
             session["user_id"] = user.id
             session["username"] = user.username
             session["firstname"] = user.firstname
+            forget_identity()
 
             cart_services.merge_session_to_db(user.id)
 
@@ -160,6 +186,7 @@ def login() -> str | Response:
 @auth_bp.route("/logout", methods=["POST"])
 def logout() -> Response:
     session.clear()
+    regenerate_session()
     flash("Déconnexion réussie", "success")
     return redirect(url_for("home"))
 
@@ -181,7 +208,7 @@ def register() -> str | Response:
             email=form["email"],
             firstname=form["firstname"],
             lastname=form["lastname"],
-            password=generate_password_hash(form["password"]),
+            password=hash_password(form["password"]),
             adresse=form.get("adresse", ""),
             code_postal=form.get("code_postal", ""),
             ville=form.get("ville", ""),
@@ -193,9 +220,11 @@ def register() -> str | Response:
         db.session.add(new_user)
         db.session.commit()
 
+        regenerate_session()
         session["user_id"] = new_user.id
         session["username"] = new_user.username
         session["firstname"] = new_user.firstname
+        forget_identity()
 
         flash("Inscription réussie!", "success")
         return redirect(url_for("home"))
@@ -203,6 +232,12 @@ def register() -> str | Response:
     return render_template("register.html")
 
 
+def _profile_saved(user: User) -> None:
+    # Le prénom affiché vient de la session et de l'identité mise en cache pour la requête
+    session["firstname"] = user.firstname
+    forget_identity()
+
+
 @auth_bp.route("/profile", methods=["GET", "POST"])
 @login_required
 def profile() -> Any:
@@ -237,6 +272,7 @@ def profile() -> Any:
             user.ville = ville
             user.pays = pays
             db.session.commit()
+            _profile_saved(user)
 
             return jsonify({"success": True})
 
@@ -252,6 +288,7 @@ def profile() -> Any:
         user.ville = ville
         user.pays = pays
         db.session.commit()
+        _profile_saved(user)
 
         return redirect(url_for("auth.profile"))
 
@@ -0,0 +1,205 @@
+"""
+Limitation des tentatives de connexion par seau à jetons (token bucket).
+
+Chaque adresse IP et chaque identifiant saisi a son seau : une tentative consomme un jeton, les
+jetons se reconstituent au rythme de ..._PER_MINUTE par minute jusqu'à ..._BURST. Un seau vide
+fait refuser la tentative (429 + Retry-After) avant toute requête SQL et tout calcul de hachage :
+une attaque par force brute ne peut plus occuper le processeur du serveur.
+
+Les seaux sont gardés :
+- LOGIN_THROTTLE_STORE = "memory" : dans chaque worker (un dict de paires (jetons, date)),
+  les limites s'appliquent alors par worker ;
+- LOGIN_THROTTLE_STORE = "sqlite" : dans une base SQLite locale partagée par les workers, chaque
+  tentative étant décomptée en une seule instruction (UPSERT conditionnel).
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import cast
+
+from flask import Flask, current_app
+
+
+class LoginThrottled(Exception):
+    """Trop de tentatives ; le client peut réessayer après retry_after secondes."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Trop de tentatives de connexion")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class BucketRule:
+    burst: int
+    per_minute: float
+
+    @property
+    def rate(self) -> float:
+        """Jetons reconstitués par seconde."""
+        return self.per_minute / 60
+
+
+class MemoryBucketStore:
+    """Seaux de ce worker. Un seau redevenu plein équivaut à un seau absent : il est retiré."""
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: BucketRule, now: float) -> float:
+        """Consomme un jeton ; retourne 0 si accepté, sinon le délai avant le prochain jeton."""
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rule.burst, now))
+            tokens = min(rule.burst, tokens + (now - updated) * rule.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rule.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(rule, now)
+            return 0.0
+
+    def _prune(self, rule: BucketRule, now: float) -> None:
+        full_after = rule.burst / rule.rate
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= full_after:
+                del self._buckets[key]
+        # Toujours trop de seaux actifs : les plus anciens (ordre d'insertion) partent
+        while len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """Seaux partagés par les workers dans une base SQLite locale (WAL), une connexion par thread."""
+
+    # Le seau est créé plein moins un jeton, ou décompté seulement s'il lui reste un jeton :
+    # aucune ligne renvoyée signifie un refus
+    _TAKE_SQL = (
+        "INSERT INTO login_buckets (key, tokens, updated) VALUES (:key, :burst - 1, :now) "
+        "ON CONFLICT (key) DO UPDATE SET "
+        "tokens = min(:burst, tokens + (:now - updated) * :rate) - 1, updated = :now "
+        "WHERE min(:burst, tokens + (:now - updated) * :rate) >= 1 "
+        "RETURNING tokens"
+    )
+
+    # Les seaux inactifs depuis plus longtemps sont pleins (avec les réglages habituels) : supprimés
+    # toutes les PRUNE_EVERY tentatives acceptées par ce worker
+    PRUNE_AFTER = 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS login_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+        conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rule: BucketRule, now: float) -> float:
+        params = {"key": key, "burst": rule.burst, "rate": rule.rate, "now": now}
+        conn = self._conn()
+        if conn.execute(self._TAKE_SQL, params).fetchone() is not None:
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                self.prune(now, self.PRUNE_AFTER)
+            return 0.0
+        row = conn.execute(
+            "SELECT min(:burst, tokens + (:now - updated) * :rate) FROM login_buckets WHERE key = :key",
+            params,
+        ).fetchone()
+        tokens = row[0] if row else 0.0
+        return max(1 - tokens, 0.0) / rule.rate
+
+    def prune(self, now: float, older_than: float) -> int:
+        deleted = self._conn().execute("DELETE FROM login_buckets WHERE updated < ?", (now - older_than,))
+        return deleted.rowcount
+
+    def __len__(self) -> int:
+        return int(self._conn().execute("SELECT count(*) FROM login_buckets").fetchone()[0])
+
+
+class LoginThrottle:
+    """Seau par adresse IP puis seau par identifiant, avec compteurs pour le suivi."""
+
+    def __init__(
+        self, store: MemoryBucketStore | SQLiteBucketStore, ip_rule: BucketRule, username_rule: BucketRule
+    ) -> None:
+        self.store = store
+        self.ip_rule = ip_rule
+        self.username_rule = username_rule
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected_ip = 0
+        self.rejected_username = 0
+
+    def hit(self, ip: str | None, username: str) -> None:
+        """Décompte une tentative de connexion. Lève LoginThrottled si l'un des seaux est vide."""
+        now = time.time()
+        wait = self.store.take(f"ip:{ip or '-'}", self.ip_rule, now)
+        if wait:
+            self._count("rejected_ip")
+            raise LoginThrottled(int(wait) + 1)
+        wait = self.store.take(f"user:{username.strip().lower()}", self.username_rule, now)
+        if wait:
+            self._count("rejected_username")
+            raise LoginThrottled(int(wait) + 1)
+        self._count("allowed")
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            "buckets": len(self.store),
+            "allowed": self.allowed,
+            "rejected_ip": self.rejected_ip,
+            "rejected_username": self.rejected_username,
+        }
+
+
+def init_login_throttle(app: Flask) -> None:
+    """Crée le limiteur de connexions de l'application à partir de sa configuration."""
+    config = app.config
+    kind = config["LOGIN_THROTTLE_STORE"]
+    store: MemoryBucketStore | SQLiteBucketStore
+    if kind == "memory":
+        store = MemoryBucketStore(config["LOGIN_THROTTLE_MAX_KEYS"])
+    elif kind == "sqlite":
+        store = SQLiteBucketStore(config["LOGIN_THROTTLE_SQLITE_PATH"])
+    else:
+        raise ValueError(f"LOGIN_THROTTLE_STORE inconnu : {kind!r} (memory ou sqlite)")
+    app.extensions["login_throttle"] = LoginThrottle(
+        store,
+        ip_rule=BucketRule(config["LOGIN_THROTTLE_IP_BURST"], config["LOGIN_THROTTLE_IP_PER_MINUTE"]),
+        username_rule=BucketRule(
+            config["LOGIN_THROTTLE_USERNAME_BURST"], config["LOGIN_THROTTLE_USERNAME_PER_MINUTE"]
+        ),
+    )
+
+
+def get_throttle() -> LoginThrottle:
+    return cast(LoginThrottle, current_app.extensions["login_throttle"])
@@ -1,17 +1,63 @@
+from dataclasses import dataclass
 from functools import wraps
 from typing import Any, Callable, cast
 
-from flask import redirect, session, url_for
+from flask import abort, g, redirect, session, url_for
 
+from src.models.database import db
 from src.models.user import User
 
 
+@dataclass(frozen=True)
+class Identity:
+    """Ce que la plupart des pages savent de l'utilisateur connecté, sans charger toute sa ligne."""
+
+    id: int
+    username: str
+    role: str
+    firstname: str
+
+
+def get_identity() -> Identity | None:
+    """
+    Identité de l'utilisateur connecté, lue une fois par requête (4 colonnes) et gardée sur flask.g.
+    None si personne n'est connecté ou si le compte n'existe plus.
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return None
+    identity = g.get("_identity")
+    if identity is not None and identity.id == user_id:
+        return cast(Identity, identity)
+    user = g.get("_current_user")
+    if user is not None and user.id == user_id:
+        # La ligne complète est déjà chargée : pas de nouvelle requête
+        row: Any = user
+    else:
+        row = db.session.execute(
+            db.select(User.id, User.username, User.role, User.firstname).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+    g._identity = Identity(row.id, row.username, row.role, row.firstname)
+    return cast(Identity, g._identity)
+
+
 def get_current_user() -> User | None:
-    """Retourne l'utilisateur connecté ou None"""
+    """Retourne l'utilisateur connecté (ligne complète, pour l'afficher ou la modifier) ou None"""
     user_id = session.get("user_id")
-    if user_id:
-        return cast(User | None, User.query.get(user_id))
-    return None
+    if not user_id:
+        return None
+    user = g.get("_current_user")
+    if user is None or user.id != user_id:
+        user = g._current_user = db.session.get(User, user_id)
+    return cast(User | None, user)
+
+
+def forget_identity() -> None:
+    """À appeler quand l'utilisateur connecté change ou modifie son profil pendant la requête."""
+    g.pop("_identity", None)
+    g.pop("_current_user", None)
 
 
 def login_required(f: Callable[..., Any]) -> Callable[..., Any]:
@@ -19,9 +65,27 @@ def login_required(f: Callable[..., Any]) -> Callable[..., Any]:
 
     @wraps(f)
     def decorated_function(*args: Any, **kwargs: Any) -> Any:
-        if "user_id" not in session:
+        if get_identity() is None:
             session["login_error"] = "Veuillez vous connecter"
             return redirect(url_for("home"))
         return f(*args, **kwargs)
 
     return decorated_function
+
+
+def role_required(*roles: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Décorateur réservant une route à certains rôles (401 si non connecté, 403 sinon)"""
+
+    def decorator(f: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(f)
+        def decorated_function(*args: Any, **kwargs: Any) -> Any:
+            identity = get_identity()
+            if identity is None:
+                abort(401)
+            if identity.role not in roles:
+                abort(403)
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,170 @@
+"""
+Validation de commande : transforme le panier actif d'un utilisateur en commande.
+
+Tout se fait dans une seule transaction courte, en un nombre fixe d'instructions quel que soit
+le nombre de lignes :
+
+1. passage du panier au statut "ordered" par un UPDATE conditionnel (Cart.place_order), qui
+   sert aussi de verrou : une validation concurrente du même panier ne modifie aucune ligne ;
+2. décrément du stock de toutes les lignes par un seul UPDATE ... CASE, conditionné au stock
+   disponible ; les quantités déjà réservées par le panier (src/cart/stock.py) sont déjà déduites,
+   seul le complément (réservation expirée, par exemple) est retiré ;
+3. gel des prix : cart_items.unit_price reçoit le prix courant des produits ;
+4. suppression des réservations consommées.
+
+Une clé d'idempotence (en-tête Idempotency-Key) permet au client de renvoyer sa requête sans
+risque : la commande déjà passée avec cette clé est renvoyée telle quelle.
+"""
+
+from dataclasses import dataclass
+
+from sqlalchemy import case
+
+from src.cart import services as cart_services
+from src.cart import stock
+from src.catalog import services as catalog_services
+from src.models.cart import Cart
+from src.models.cart_item import CartItem
+from src.models.database import db
+from src.models.product import Product
+from src.models.stock_reservation import StockReservation
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+
+@dataclass
+class CheckoutError(Exception):
+    """Validation refusée ; la transaction a été annulée, le panier est inchangé."""
+
+    error: str
+    message: str
+    status: int = 400
+    unavailable: dict[int, int] | None = None
+
+    def to_dict(self) -> dict:
+        data: dict = {"error": self.error, "message": self.message}
+        if self.unavailable is not None:
+            # product_id -> quantité réellement disponible
+            data["unavailable"] = {str(product_id): qty for product_id, qty in self.unavailable.items()}
+        return data
+
+
+@dataclass(frozen=True)
+class CheckoutResult:
+    order: Cart
+    replayed: bool = False
+
+
+def _decrement_stock(missing: dict[int, int]) -> None:
+    """
+    Retire en une instruction le complément de stock nécessaire à chaque ligne. Un produit sans
+    assez de stock est écarté par la condition de l'UPDATE : CheckoutError est alors levée et
+    l'appelant annule toute la transaction.
+    """
+    delta = case(missing, value=Product.id, else_=0)
+    rows = db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(list(missing)), Product.stock_quantity >= delta)
+        .values(stock_quantity=Product.stock_quantity - delta)
+        .returning(Product.id, Product.stock_quantity)
+        .execution_options(synchronize_session=False),
+        execution_options={catalog_services.STOCK_ONLY_OPTION: True},
+    ).all()
+    if len(rows) != len(missing):
+        updated = {product_id for product_id, _ in rows}
+        available = dict(
+            db.session.execute(
+                db.select(Product.id, Product.stock_quantity).where(
+                    Product.id.in_([product_id for product_id in missing if product_id not in updated])
+                )
+            ).all()
+        )
+        raise CheckoutError(
+            "Stock insuffisant",
+            "Certains produits ne sont plus disponibles en quantité suffisante",
+            status=409,
+            unavailable=available,
+        )
+    if any(stock.crosses_display_threshold(after + missing[pid], after) for pid, after in rows):
+        catalog_services.mark_changed(db.session)
+
+
+def _replay(user_id: int, idempotency_key: str | None) -> CheckoutResult | None:
+    """Commande déjà passée avec cette clé d'idempotence, s'il y en a une."""
+    if idempotency_key is None:
+        return None
+    previous = Cart.find_by_idempotency_key(user_id, idempotency_key)
+    return CheckoutResult(previous, replayed=True) if previous is not None else None
+
+
+def _cart_lines(cart: Cart) -> dict[int, int]:
+    return dict(
+        db.session.execute(
+            db.select(CartItem.product_id, CartItem.quantity).where(CartItem.cart_id == cart.id)
+        ).all()
+    )
+
+
+def checkout(user_id: int, idempotency_key: str | None = None) -> CheckoutResult:
+    """Valide le panier actif de l'utilisateur. Lève CheckoutError si la commande est impossible."""
+    if idempotency_key is not None and len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise CheckoutError("Clé d'idempotence trop longue", "Requête invalide")
+    replayed = _replay(user_id, idempotency_key)
+    if replayed is not None:
+        return replayed
+
+    # Les modifications de panier en attente de cette requête doivent être en base
+    cart_services.flush_writes()
+
+    cart = Cart.find_active_cart(user_id)
+    lines = _cart_lines(cart) if cart is not None else {}
+    if cart is None or not lines:
+        raise CheckoutError("Panier vide", "Votre panier est vide")
+
+    holder = stock.holder_for(user_id)
+    try:
+        if not cart.place_order(idempotency_key):
+            raise CheckoutError("Commande déjà validée", "Ce panier a déjà été commandé", status=409)
+
+        reserved = dict(
+            db.session.execute(
+                db.select(StockReservation.product_id, StockReservation.quantity).where(
+                    StockReservation.holder == holder, StockReservation.product_id.in_(list(lines))
+                )
+            ).all()
+        )
+        missing = {
+            product_id: qty - reserved.get(product_id, 0)
+            for product_id, qty in lines.items()
+            if qty != reserved.get(product_id, 0)
+        }
+        if missing:
+            _decrement_stock(missing)
+
+        # Gel des prix au moment de la commande
+        db.session.execute(
+            db.update(CartItem)
+            .where(CartItem.cart_id == cart.id)
+            .values(
+                unit_price=db.select(Product.price)
+                .where(Product.id == CartItem.product_id)
+                .scalar_subquery()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            db.delete(StockReservation).where(
+                StockReservation.holder == holder, StockReservation.product_id.in_(list(lines))
+            )
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Deux validations simultanées avec la même clé : la seconde renvoie la commande de la première
+        replayed = _replay(user_id, idempotency_key)
+        if replayed is not None:
+            return replayed
+        raise
+
+    cart_services.invalidate_view()
+    return CheckoutResult(cart)
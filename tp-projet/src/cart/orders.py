@@ -0,0 +1,78 @@
+"""
+Historique des commandes.
+
+Les pages sont découpées par clé (keyset) et non par OFFSET : le curseur renvoyé au client encode
+(ordered_at, id) de la dernière commande affichée, la page suivante commence juste après. Chaque
+page coûte une requête servie par les index partiels ix_carts_user_orders_ordered_at /
+ix_carts_orders_ordered_at, quelle que soit sa position dans l'historique. Nombre d'articles et
+total sont calculés dans la même requête (Cart.item_count / Cart.total).
+
+L'export de toutes les commandes (administration) est lu par lots avec yield_per : la mémoire
+utilisée ne dépend pas du nombre de commandes.
+"""
+
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import Row
+
+from src.models.cart import Cart
+from src.models.database import db
+
+ORDER_PAGE_SIZE_DEFAULT = 20
+ORDER_PAGE_SIZE_MAX = 100
+EXPORT_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class OrderPage:
+    orders: list[dict]
+    next_cursor: str | None
+
+
+def encode_cursor(ordered_at: datetime, cart_id: int) -> str:
+    raw = f"{ordered_at.isoformat()}|{cart_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Lève ValueError si le curseur n'a pas été produit par encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ordered_at, cart_id = raw.split("|")
+        return datetime.fromisoformat(ordered_at), int(cart_id)
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Curseur invalide") from exc
+
+
+def order_summary(row: Row) -> dict:
+    return {
+        "id": row.id,
+        "user_id": row.user_id,
+        "status": row.status,
+        "ordered_at": row.ordered_at.isoformat(),
+        "item_count": int(row.item_count),
+        "total": round(row.total, 2),
+    }
+
+
+def user_orders(user_id: int, limit: int = ORDER_PAGE_SIZE_DEFAULT, cursor: str | None = None) -> OrderPage:
+    """Une page de l'historique de l'utilisateur. Lève ValueError si le curseur est invalide."""
+    limit = max(1, min(limit, ORDER_PAGE_SIZE_MAX))
+    before = decode_cursor(cursor) if cursor else None
+    # Une ligne de plus que demandé : sa présence indique qu'il existe une page suivante
+    rows = Cart.find_orders_by_user(user_id, limit + 1, before)
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].ordered_at, page[-1].id) if len(rows) > limit else None
+    return OrderPage([order_summary(row) for row in page], next_cursor)
+
+
+def iter_orders(status: str | None = None) -> Iterator[dict]:
+    """Toutes les commandes (ou celles du statut donné), lues par lots de EXPORT_BATCH_SIZE lignes."""
+    result = db.session.execute(
+        Cart.orders_query(status=status).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    for row in result:
+        yield order_summary(row)
@@ -1,97 +1,430 @@
-from flask import session
+from dataclasses import dataclass, field
+from typing import Any, Iterable, cast
 
+from flask import g, session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import QueryableAttribute, selectinload
+
+from src.cart import stock
 from src.models.cart import Cart
 from src.models.cart_item import CartItem
 from src.models.database import db
 from src.models.product import Product
 
 
-def add_or_update_item(product_id: int, quantity: int = 1, user_id: int | None = None) -> None:
-    cart = session.get("cart", {})
-    product_id_str = str(product_id)
+class CartView:
+    """
+    Vue du panier pour la requête en cours. Les produits ne sont chargés qu'une fois, au premier
+    accès aux lignes : nombre d'articles, total et lignes détaillées partagent ce chargement.
+    Obtenue via get_view() et tenue à jour par les fonctions qui modifient le panier.
+    """
+
+    def __init__(
+        self,
+        user_id: int | None,
+        quantities: dict[int, int],
+        products: list[Product] | None = None,
+        reserved: dict[int, int] | None = None,
+    ) -> None:
+        self.user_id = user_id
+        self.quantities = quantities
+        # Produits déjà chargés par l'appelant (apply_batch) : pas de nouvelle requête.
+        # reserved : quantités de ce panier déjà déduites du stock de ces produits
+        self._items: list[dict] | None = (
+            None if products is None else self._build_items(products, reserved or {})
+        )
+
+    def quantity_of(self, product_id: int) -> int:
+        return self.quantities.get(product_id, 0)
+
+    def set_quantity(self, product_id: int, quantity: int) -> None:
+        if quantity > 0:
+            self.quantities[product_id] = quantity
+        else:
+            self.quantities.pop(product_id, None)
+        # Les lignes détaillées seront recalculées au prochain accès
+        self._items = None
+
+    @property
+    def count(self) -> int:
+        """Nombre total d'articles (ne nécessite pas de charger les produits)."""
+        return sum(self.quantities.values())
+
+    @property
+    def items(self) -> list[dict]:
+        """Lignes du panier avec les infos produit."""
+        if self._items is None:
+            self._items = self._load_items()
+        return self._items
+
+    @property
+    def total(self) -> float:
+        return float(sum(item["subtotal"] for item in self.items))
+
+    def _load_items(self) -> list[dict]:
+        if not self.quantities:
+            return []
+        return self._build_items(_load_products(self.quantities), self.quantities)
+
+    def _build_items(self, products: list[Product], reserved: dict[int, int]) -> list[dict]:
+        items = []
+        for product in products:
+            qty = self.quantities.get(product.id)
+            if not qty:
+                continue
+            items.append(
+                {
+                    "product_id": product.id,
+                    "product_name": product.name,
+                    "product_image": product.image_url,
+                    "quantity": qty,
+                    "unit_price": product.price,
+                    "subtotal": round(product.price * qty, 2),
+                    # Quantité maximale commandable : stock libre + ce que ce panier a déjà réservé
+                    "stock_quantity": product.stock_quantity + reserved.get(product.id, 0),
+                }
+            )
+        return items
+
+
+def _load_products(product_ids: Iterable[int]) -> list[Product]:
+    return cast(
+        list[Product],
+        Product.query.options(selectinload(cast(QueryableAttribute, Product.images)))
+        .filter(Product.id.in_(list(product_ids)))
+        .order_by(Product.id)
+        .all(),
+    )
+
+
+def _load_db_quantities(user_id: int) -> dict[int, int]:
+    rows = db.session.execute(
+        db.select(CartItem.product_id, CartItem.quantity)
+        .join(Cart, Cart.id == CartItem.cart_id)
+        .where(Cart.user_id == user_id, Cart.status == "cart")
+    ).all()
+    return {product_id: quantity for product_id, quantity in rows}
+
+
+def get_view(user_id: int | None = None) -> CartView:
+    """
+    Vue du panier de la requête en cours, construite une seule fois et gardée sur flask.g.
+    Utilisateur connecté : panier actif en base ; visiteur anonyme : panier de la session.
+    """
+    view = cast("CartView | None", g.get("_cart_view"))
+    if view is None or view.user_id != user_id:
+        if user_id is None:
+            cart = session.get("cart", {})
+            quantities = {int(product_id): int(qty) for product_id, qty in cart.items()}
+        else:
+            quantities = _load_db_quantities(user_id)
+        view = CartView(user_id, quantities)
+        g._cart_view = view
+    return view
+
+
+def invalidate_view() -> None:
+    g.pop("_cart_view", None)
+
+
+@dataclass
+class CartWrites:
+    """
+    Modifications du panier en base d'un utilisateur connecté, accumulées pendant la requête.
+    Plusieurs changements sur un même produit se résument à la dernière quantité (0 = suppression).
+    """
+
+    user_id: int
+    quantities: dict[int, int] = field(default_factory=dict)
+    clear: bool = False
+
+
+def _pending_writes(user_id: int) -> CartWrites:
+    writes = cast("CartWrites | None", g.get("_cart_writes"))
+    if writes is None or writes.user_id != user_id:
+        writes = CartWrites(user_id)
+        g._cart_writes = writes
+    return writes
+
+
+def _store_quantities(view: CartView, changed: Iterable[int]) -> None:
+    """Enregistre les quantités de la vue pour les produits modifiés (session ou tampon d'écriture)."""
+    if view.user_id is None:
+        session["cart"] = {str(product_id): qty for product_id, qty in view.quantities.items()}
+        session.modified = True
+        return
+    writes = _pending_writes(view.user_id)
+    for product_id in changed:
+        writes.quantities[product_id] = view.quantity_of(product_id)
+
+
+def _reserve(user_id: int | None, quantities: dict[int, int]) -> None:
+    """
+    Réserve le stock du panier (lève stock.InsufficientStock) dans la transaction de la requête :
+    flush_writes la valide avec les lignes du panier.
+    """
+    stock.set_reserved(stock.holder_for(user_id), quantities)
+    g._stock_reserved = True
+
+
+def _write_lines(writes: CartWrites) -> None:
+    cart = Cart.get_or_create_cart(writes.user_id)
+    db.session.flush()
+
+    removed = [product_id for product_id, qty in writes.quantities.items() if qty <= 0]
+    if writes.clear or removed:
+        stmt = db.delete(CartItem).where(CartItem.cart_id == cart.id)
+        if not writes.clear:
+            stmt = stmt.where(CartItem.product_id.in_(removed))
+        db.session.execute(stmt)
+
+    kept = {product_id: qty for product_id, qty in writes.quantities.items() if qty > 0}
+    if kept:
+        _save_lines(cart.id, kept)
+
+
+def flush_writes() -> None:
+    """
+    Écrit en base, en une transaction, les modifications de panier accumulées pendant la requête
+    et les réservations de stock correspondantes : les deux sont validées ensemble.
+    Appelée après chaque requête : le nombre d'écritures ne dépend pas du nombre d'opérations.
+    """
+    writes = cast("CartWrites | None", g.pop("_cart_writes", None))
+    reserved = g.pop("_stock_reserved", False)
+    if writes is not None and not writes.quantities and not writes.clear:
+        writes = None
+    if writes is None and not reserved:
+        return
+    try:
+        if writes is not None:
+            _write_lines(writes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        invalidate_view()
+        raise
+
+
+def _set_quantity(view: CartView, product_id: int, quantity: int) -> None:
+    """Réserve le stock puis enregistre la nouvelle quantité (lève stock.InsufficientStock)."""
+    _reserve(view.user_id, {product_id: max(quantity, 0)})
+    view.set_quantity(product_id, quantity)
+    _store_quantities(view, [product_id])
 
-    current_qty = int(cart.get(product_id_str, 0))
-    cart[product_id_str] = current_qty + quantity
 
-    session["cart"] = cart
-    session.modified = True
+def add_or_update_item(product_id: int, quantity: int = 1, user_id: int | None = None) -> None:
+    view = get_view(user_id)
+    _set_quantity(view, product_id, view.quantity_of(product_id) + quantity)
 
 
 def update_item_quantity(product_id: int, quantity: int, user_id: int | None = None) -> None:
     """Met à jour la quantité d'un produit (ne cumule pas, remplace)."""
-    cart = session.get("cart", {})
-    product_id_str = str(product_id)
+    _set_quantity(get_view(user_id), product_id, quantity)
 
-    if quantity > 0:
-        cart[product_id_str] = quantity
-    else:
-        cart.pop(product_id_str, None)
 
-    session["cart"] = cart
-    session.modified = True
+BATCH_MAX_OPERATIONS = 100
+BATCH_OPERATIONS = ("add", "update", "remove")
 
 
-def get_items(user_id: int | None = None) -> list[dict]:
-    """Récupère la liste complète des produits du panier avec leurs infos."""
-    items = []
-    cart = session.get("cart", {})
+@dataclass
+class CartOperationError(Exception):
+    """Opération de panier refusée ; aucune modification n'a été appliquée."""
 
-    if cart:
+    error: str
+    message: str
+    status: int = 400
+    index: int | None = None
+    available: int | None = None
 
-        product_ids = [int(k) for k in cart.keys()]
-        products = Product.query.filter(Product.id.in_(product_ids)).all()
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {"error": self.error, "message": self.message}
+        if self.index is not None:
+            data["index"] = self.index
+        if self.available is not None:
+            data["available"] = self.available
+        return data
 
-        for product in products:
-            qty = int(cart.get(str(product.id), 0))
-            items.append(
-                {
-                    "product_id": product.id,
-                    "product_name": product.name,
-                    "product_image": product.image,
-                    "quantity": qty,
-                    "unit_price": product.price,
-                    "subtotal": round(product.price * qty, 2),
-                    "stock_quantity": product.stock_quantity,
-                }
-            )
 
-    return items
+def _parse_operation(index: int, raw: Any) -> tuple[str, int, int]:
+    if not isinstance(raw, dict) or raw.get("op") not in BATCH_OPERATIONS:
+        raise CartOperationError(
+            f"L'opération doit être l'une de : {', '.join(BATCH_OPERATIONS)}",
+            "Opération invalide",
+            index=index,
+        )
+    op = raw["op"]
+    try:
+        product_id = int(raw["product_id"])
+        quantity = int(raw.get("quantity", 1 if op == "add" else 0))
+    except (KeyError, TypeError, ValueError):
+        raise CartOperationError(
+            "La quantité et le produit doivent être des nombres entiers", "Opération invalide", index=index
+        )
+    if op != "remove" and quantity <= 0:
+        raise CartOperationError("La quantité doit être au moins 1", "Quantité invalide", index=index)
+    return op, product_id, quantity
+
+
+def apply_batch(operations: Any, user_id: int | None = None) -> CartView:
+    """
+    Applique une liste d'opérations (add / update / remove) au panier, tout ou rien.
+    operations est le contenu JSON reçu tel quel : il est validé ici.
+
+    Les produits concernés (et ceux déjà dans le panier) sont chargés en une seule requête, qui sert
+    à la fois à valider le stock et à construire la vue renvoyée. Lève CartOperationError sans rien
+    modifier si une opération est invalide.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise CartOperationError("Aucune opération fournie", "Requête invalide")
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        raise CartOperationError(
+            f"{BATCH_MAX_OPERATIONS} opérations maximum par requête", "Requête invalide", status=413
+        )
+    parsed = [_parse_operation(index, raw) for index, raw in enumerate(operations)]
+
+    current = get_view(user_id)
+    quantities = dict(current.quantities)
+    products = {
+        product.id: product for product in _load_products({*quantities, *(pid for _, pid, _ in parsed)})
+    }
+
+    last_index: dict[int, int] = {}
+    for index, (op, product_id, quantity) in enumerate(parsed):
+        last_index[product_id] = index
+        product = products.get(product_id)
+        if op == "remove":
+            if product_id not in quantities:
+                raise CartOperationError(
+                    "Produit non trouvé dans le panier",
+                    "Ce produit n'est pas dans votre panier",
+                    status=404,
+                    index=index,
+                )
+            del quantities[product_id]
+            continue
+        if product is None:
+            raise CartOperationError("Produit non trouvé", "Ce produit n'existe pas", status=404, index=index)
+        quantities[product_id] = quantities.get(product_id, 0) + quantity if op == "add" else quantity
+
+    # Vue construite avant la réservation, qui modifie le stock des produits chargés : leur stock
+    # est donc celui d'avant les réservations de ce panier.
+    view = CartView(user_id, quantities, list(products.values()), reserved=current.quantities)
+
+    # Réservation atomique du stock pour toutes les lignes modifiées (tout ou rien)
+    changed = {
+        product_id: quantities.get(product_id, 0)
+        for product_id in last_index
+        if quantities.get(product_id, 0) != current.quantity_of(product_id)
+    }
+    try:
+        _reserve(user_id, changed)
+    except stock.InsufficientStock as exc:
+        raise CartOperationError(
+            "Stock insuffisant",
+            str(exc),
+            index=last_index[exc.product_id],
+            available=exc.available,
+        )
+
+    g._cart_view = view
+    _store_quantities(view, {*current.quantities, *quantities})
+    return view
+
+
+def get_items(user_id: int | None = None) -> list[dict]:
+    """Récupère la liste complète des produits du panier avec leurs infos."""
+    return get_view(user_id).items
 
 
 def get_count(user_id: int | None = None) -> int:
     """Compte le nombre total d'articles."""
-    cart = session.get("cart", {})
-    if not cart:
-        return 0
-    return sum(int(qty) for qty in cart.values())
+    return get_view(user_id).count
 
 
 def get_total(user_id: int | None = None) -> float:
     """Calcule le prix total du panier."""
-    items = get_items(user_id)
-    return float(sum(item["subtotal"] for item in items))
+    return get_view(user_id).total
 
 
 def remove_item(product_id: int, user_id: int | None = None) -> None:
     """Supprime un article du panier."""
-    product_id_str = str(product_id)
-    cart = session.get("cart", {})
-
-    if product_id_str in cart:
-        del cart[product_id_str]
-        session["cart"] = cart
-        session.modified = True
+    view = get_view(user_id)
+    if view.quantity_of(product_id):
+        _set_quantity(view, product_id, 0)
 
 
 def clear(user_id: int | None = None) -> None:
     """Vide le panier."""
-    session.pop("cart", None)
+    stock.release_all(stock.holder_for(user_id))
+    # Libération validée par flush_writes, comme une réservation
+    g._stock_reserved = True
+    if user_id is None:
+        session.pop("cart", None)
+    else:
+        writes = _pending_writes(user_id)
+        writes.quantities.clear()
+        writes.clear = True
+    g._cart_view = CartView(user_id, {})
+
+
+def _upsert_items(rows: list[dict[str, Any]]) -> None:
+    """
+    Insère les lignes du panier, ou met à jour quantité et prix de celles qui existent déjà,
+    en une seule requête INSERT ... ON CONFLICT (cart_id, product_id) DO UPDATE.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        stmt = insert(CartItem).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id],
+            set_={"quantity": stmt.excluded.quantity, "unit_price": stmt.excluded.unit_price},
+        )
+        db.session.execute(stmt)
+        return
+
+    # Autres SGBD : une lecture des lignes existantes, puis insertions et mises à jour groupées
+    cart_id = rows[0]["cart_id"]
+    existing = dict(
+        db.session.execute(
+            db.select(CartItem.product_id, CartItem.id).where(
+                CartItem.cart_id == cart_id, CartItem.product_id.in_([row["product_id"] for row in rows])
+            )
+        ).all()
+    )
+    updates = [{**row, "id": existing[row["product_id"]]} for row in rows if row["product_id"] in existing]
+    inserts = [row for row in rows if row["product_id"] not in existing]
+    if updates:
+        db.session.execute(db.update(CartItem), updates)
+    if inserts:
+        db.session.execute(db.insert(CartItem), inserts)
+
+
+def _save_lines(cart_id: int, quantities: dict[int, int]) -> None:
+    """
+    Enregistre les lignes d'un panier au prix actuel des produits : une requête pour tous les prix,
+    un upsert pour toutes les lignes. Les produits supprimés entre-temps sont ignorés.
+    """
+    prices = dict(
+        db.session.execute(db.select(Product.id, Product.price).where(Product.id.in_(list(quantities)))).all()
+    )
+    rows = [
+        {"cart_id": cart_id, "product_id": product_id, "quantity": qty, "unit_price": prices[product_id]}
+        for product_id, qty in quantities.items()
+        if product_id in prices
+    ]
+    if rows:
+        _upsert_items(rows)
 
 
 def merge_session_to_db(user_id: int) -> None:
     """
     Migre le panier de la session vers la base de données.
     Appelée lors de la connexion d'un utilisateur.
+
+    Le coût ne dépend pas de la taille du panier : une requête pour les prix, une pour le panier
+    actif (plus sa création éventuelle) et un seul upsert pour toutes les lignes, en une transaction.
     """
     try:
         # Récupérer le panier en session
@@ -100,32 +433,21 @@ def merge_session_to_db(user_id: int) -> None:
         if not session_cart:
             return
 
-        # Créer ou récupérer le panier de l'utilisateur
-        user_cart = Cart.query.filter_by(user_id=user_id).first()
-        if not user_cart:
-            user_cart = Cart(user_id=user_id)
-            db.session.add(user_cart)
-            db.session.commit()
-
-        # Ajouter les articles du panier en session à la base de données
-        for product_id_str, quantity in session_cart.items():
-            product_id = int(product_id_str)
-
-            # Vérifier si l'article existe déjà dans le panier
-            cart_item = CartItem.query.filter_by(cart_id=user_cart.id, product_id=product_id).first()
+        quantities = {int(product_id): int(qty) for product_id, qty in session_cart.items() if int(qty) > 0}
 
-            if cart_item:
-                # Mettre à jour la quantité
-                cart_item.quantity = quantity
-            else:
-                # Créer un nouvel article
-                cart_item = CartItem(cart_id=user_cart.id, product_id=product_id, quantity=quantity)
-                db.session.add(cart_item)
+        # Créer ou récupérer le panier actif de l'utilisateur
+        user_cart = Cart.get_or_create_cart(user_id)
+        db.session.flush()
 
+        if quantities:
+            _save_lines(user_cart.id, quantities)
+        # Les réservations de stock du visiteur passent à l'utilisateur, dans la même transaction
+        stock.transfer(stock.holder_for(None), stock.holder_for(user_id))
         db.session.commit()
 
         # Vider la session du panier
         session.pop("cart", None)
+        invalidate_view()
 
     except Exception as e:
         print(f"Erreur lors de la migration du panier: {e}")
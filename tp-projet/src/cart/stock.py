@@ -0,0 +1,297 @@
+"""
+Réservation atomique du stock par les paniers.
+
+products.stock_quantity contient le stock encore disponible : ajouter un article au panier le
+décrémente immédiatement par un UPDATE conditionnel
+
+    UPDATE products SET stock_quantity = stock_quantity - :q WHERE id = :id AND stock_quantity >= :q
+
+qui vérifie et réserve en une seule instruction, sans lecture préalable ni verrou applicatif :
+deux acheteurs concurrents (workers gunicorn différents) ne peuvent pas obtenir plus que le stock.
+La quantité réservée est notée dans stock_reservations avec une date d'expiration. Pour un même
+détenteur, la ligne de réservation est verrouillée avant d'être lue (set_reserved) : deux requêtes
+concurrentes du même panier calculent leur écart l'une après l'autre. Les réservations sont
+écrites dans la transaction de l'appelant, qui les valide avec les lignes du panier
+(src/cart/services.py, flush_writes). Les réservations expirées (panier abandonné) sont rendues
+au stock par release_expired(), lancée au plus une fois par STOCK_RESERVATION_SWEEP_INTERVAL
+secondes et par worker.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, cast
+
+from flask import current_app, session
+from sqlalchemy import case
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.catalog import services as catalog_services
+from src.models.database import db
+from src.models.product import Product
+from src.models.stock_reservation import StockReservation
+
+# Seuils affichés dans les pages du catalogue (épuisé, badge « Vite ! ») : les franchir invalide
+# l'instantané du catalogue, les autres variations de stock non
+LOW_STOCK_THRESHOLD = 5
+
+_STOCK_ONLY = {catalog_services.STOCK_ONLY_OPTION: True}
+
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+
+class InsufficientStock(Exception):
+    """Le stock disponible ne permet pas la réservation demandée ; rien n'a été réservé."""
+
+    def __init__(self, product_id: int, requested: int, available: int) -> None:
+        super().__init__(f"Stock insuffisant. Disponible: {available}")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+def holder_for(user_id: int | None) -> str:
+    """Identifiant du détenteur des réservations : l'utilisateur, ou un jeton gardé en session."""
+    if user_id is not None:
+        return f"user:{user_id}"
+    token = session.get("cart_token")
+    if token is None:
+        token = session["cart_token"] = uuid.uuid4().hex
+    return f"session:{token}"
+
+
+def crosses_display_threshold(before: int, after: int) -> bool:
+    return (before > 0) != (after > 0) or (before < LOW_STOCK_THRESHOLD) != (after < LOW_STOCK_THRESHOLD)
+
+
+def _adjust_stock(product_id: int, delta: int) -> int | None:
+    """
+    Retire (delta > 0) ou rend (delta < 0) du stock en une instruction. Retourne le nouveau stock,
+    ou None si le stock disponible est insuffisant (aucune ligne modifiée).
+    """
+    stmt = db.update(Product).where(Product.id == product_id)
+    if delta > 0:
+        stmt = stmt.where(Product.stock_quantity >= delta)
+    stmt = stmt.values(stock_quantity=Product.stock_quantity - delta).returning(Product.stock_quantity)
+    new_stock = cast("int | None", db.session.execute(stmt, execution_options=_STOCK_ONLY).scalar())
+    if new_stock is not None and crosses_display_threshold(new_stock + delta, new_stock):
+        catalog_services.mark_changed(db.session)
+    return new_stock
+
+
+def _available(product_id: int) -> int:
+    return int(db.session.scalar(db.select(Product.stock_quantity).where(Product.id == product_id)) or 0)
+
+
+def _dialect_insert() -> Any:
+    """insert() avec ON CONFLICT du dialecte courant, None si le dialecte n'en a pas."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite_insert
+    if dialect == "postgresql":
+        return postgresql_insert
+    return None
+
+
+def _lock_reservations(holder: str, product_ids: list[int], expires_at: datetime) -> dict[int, int]:
+    """
+    Verrouille les réservations du détenteur pour ces produits et retourne les quantités déjà
+    réservées. Les lignes absentes sont d'abord créées à 0 : cette écriture ouvre la transaction
+    avec le verrou d'écriture (SQLite) ou attend la transaction concurrente qui crée la même ligne
+    (PostgreSQL), puis la lecture FOR UPDATE verrouille les lignes jusqu'au commit.
+    """
+    insert = _dialect_insert()
+    if insert is not None:
+        rows = [
+            {"holder": holder, "product_id": product_id, "quantity": 0, "expires_at": expires_at}
+            for product_id in product_ids
+        ]
+        db.session.execute(
+            insert(StockReservation)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=[StockReservation.holder, StockReservation.product_id])
+        )
+    return dict(
+        db.session.execute(
+            db.select(StockReservation.product_id, StockReservation.quantity)
+            .where(StockReservation.holder == holder, StockReservation.product_id.in_(product_ids))
+            .with_for_update()
+        ).all()
+    )
+
+
+def _upsert_reservations(rows: list[dict]) -> None:
+    insert = _dialect_insert()
+    if insert is not None:
+        stmt = insert(StockReservation).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StockReservation.holder, StockReservation.product_id],
+            set_={"quantity": stmt.excluded.quantity, "expires_at": stmt.excluded.expires_at},
+        )
+        db.session.execute(stmt)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            db.update(StockReservation)
+            .where(StockReservation.holder == row["holder"], StockReservation.product_id == row["product_id"])
+            .values(quantity=row["quantity"], expires_at=row["expires_at"])
+        ).rowcount
+        if not updated:
+            db.session.execute(db.insert(StockReservation).values(row))
+
+
+def set_reserved(holder: str, quantities: dict[int, int]) -> None:
+    """
+    Aligne les réservations du détenteur sur les quantités voulues par produit (0 = tout libérer),
+    tout ou rien. Lève InsufficientStock si un produit manque de stock.
+    Prolonge aussi la durée de vie de toutes les réservations du détenteur.
+    Les réservations sont verrouillées avant d'être lues : l'écart avec la quantité voulue, retiré
+    du stock ou rendu, est calculé sur la dernière quantité validée.
+    Rien n'est validé ici : l'appelant committe la transaction, avec les lignes du panier.
+    """
+    maybe_release_expired()
+    if not quantities:
+        return
+    ttl = current_app.config["STOCK_RESERVATION_TTL"]
+    expires_at = StockReservation.expiry(ttl)
+    try:
+        reserved = _lock_reservations(holder, list(quantities), expires_at)
+        applied: dict[int, int] = {}
+        for product_id, wanted in quantities.items():
+            delta = wanted - reserved.get(product_id, 0)
+            if not delta:
+                continue
+            if _adjust_stock(product_id, delta) is None:
+                available = _available(product_id) + reserved.get(product_id, 0)
+                _undo(holder, applied)
+                raise InsufficientStock(product_id, wanted, available)
+            applied[product_id] = delta
+
+        kept = [
+            {"holder": holder, "product_id": product_id, "quantity": qty, "expires_at": expires_at}
+            for product_id, qty in quantities.items()
+            if qty > 0
+        ]
+        if kept:
+            _upsert_reservations(kept)
+        released = [product_id for product_id, qty in quantities.items() if qty <= 0]
+        if released:
+            db.session.execute(
+                db.delete(StockReservation).where(
+                    StockReservation.holder == holder, StockReservation.product_id.in_(released)
+                )
+            )
+        db.session.execute(
+            db.update(StockReservation).where(StockReservation.holder == holder).values(expires_at=expires_at)
+        )
+    except InsufficientStock:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _undo(holder: str, applied: dict[int, int]) -> None:
+    """
+    Annule un set_reserved refusé sans toucher au reste de la transaction de l'appelant : rend les
+    écarts déjà appliqués et supprime les réservations vides créées par _lock_reservations.
+    (Un SAVEPOINT ferait l'affaire, mais avec pysqlite le RELEASE d'un SAVEPOINT ouvert hors
+    transaction valide tout.)
+    """
+    for product_id, delta in applied.items():
+        _adjust_stock(product_id, -delta)
+    db.session.execute(
+        db.delete(StockReservation).where(StockReservation.holder == holder, StockReservation.quantity == 0)
+    )
+
+
+def release_all(holder: str) -> None:
+    """Rend au stock toutes les réservations du détenteur (panier vidé)."""
+    reserved = dict(
+        db.session.execute(
+            db.select(StockReservation.product_id, StockReservation.quantity).where(
+                StockReservation.holder == holder
+            )
+        ).all()
+    )
+    set_reserved(holder, {product_id: 0 for product_id in reserved})
+
+
+def transfer(from_holder: str, to_holder: str) -> None:
+    """
+    Transfère les réservations d'un visiteur à l'utilisateur qui vient de se connecter.
+    Pour les produits réservés des deux côtés, la réservation du visiteur remplace l'autre,
+    comme la quantité de son panier remplace celle du panier en base (merge_session_to_db).
+    Comme set_reserved, ne valide pas la transaction.
+    """
+    replaced = db.select(StockReservation.product_id).where(StockReservation.holder == from_holder)
+    overlap = dict(
+        db.session.execute(
+            db.select(StockReservation.product_id, StockReservation.quantity).where(
+                StockReservation.holder == to_holder, StockReservation.product_id.in_(replaced)
+            )
+        ).all()
+    )
+    for product_id, quantity in overlap.items():
+        _adjust_stock(product_id, -quantity)
+    if overlap:
+        db.session.execute(
+            db.delete(StockReservation).where(
+                StockReservation.holder == to_holder, StockReservation.product_id.in_(list(overlap))
+            )
+        )
+    db.session.execute(
+        db.update(StockReservation).where(StockReservation.holder == from_holder).values(holder=to_holder)
+    )
+
+
+def release_expired(now: datetime | None = None) -> int:
+    """
+    Rend au stock les réservations expirées, en deux instructions ensemblistes dans une transaction.
+    Retourne le nombre de réservations libérées. Le catalogue n'est invalidé que si un produit
+    franchit un seuil affiché (retour en stock, fin du badge « Vite ! »).
+    """
+    now = now or datetime.utcnow()
+    try:
+        rows = db.session.execute(
+            db.delete(StockReservation)
+            .where(StockReservation.expires_at < now)
+            .returning(StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        returned: dict[int, int] = {}
+        for product_id, quantity in rows:
+            if quantity:
+                returned[product_id] = returned.get(product_id, 0) + quantity
+        if returned:
+            restocked = db.session.execute(
+                db.update(Product)
+                .where(Product.id.in_(list(returned)))
+                .values(stock_quantity=Product.stock_quantity + case(returned, value=Product.id, else_=0))
+                .returning(Product.id, Product.stock_quantity)
+                .execution_options(synchronize_session=False),
+                execution_options=_STOCK_ONLY,
+            ).all()
+            if any(crosses_display_threshold(after - returned[pid], after) for pid, after in restocked):
+                catalog_services.mark_changed(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def maybe_release_expired() -> None:
+    """Lance le balayage des réservations expirées si le dernier date de plus de l'intervalle configuré."""
+    global _last_sweep
+    now = time.monotonic()
+    if now - _last_sweep < current_app.config["STOCK_RESERVATION_SWEEP_INTERVAL"]:
+        return
+    with _sweep_lock:
+        if now - _last_sweep < current_app.config["STOCK_RESERVATION_SWEEP_INTERVAL"]:
+            return
+        _last_sweep = now
+    release_expired()
@@ -1,38 +1,181 @@
-from flask import Blueprint, abort, render_template
+import hashlib
+from datetime import datetime
+from functools import cache
+from pathlib import Path
+from typing import Any, Callable
 
-from src.models.category import Category
-from src.models.product import Product
+from flask import Blueprint, abort, current_app, make_response, render_template, request, session
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+
+from src.assets.manifest import assets_version
+from src.cart import services as cart_services
+from src.catalog import services as catalog_services
+from src.catalog.search import search_products
+from src.catalog.services import CatalogFilters, CategoryView, ProductList
+from src.models.product import PAGE_SIZE_DEFAULT, Product
 
 catalog_bp = Blueprint('catalog', __name__, template_folder='templates')
 
 
+def _page_args() -> tuple[str | None, int]:
+    """Lit les paramètres de pagination ?after= et ?limit= de la requête."""
+    after = request.args.get('after') or None
+    limit = request.args.get('limit', PAGE_SIZE_DEFAULT, type=int)
+    return after, limit
+
+
+@cache
+def _templates_version() -> str:
+    """Empreinte des templates, calculée une fois par worker : un déploiement change les ETags."""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in sorted(Path(current_app.root_path, 'src').rglob('*.html')):
+        stat = path.stat()
+        digest.update(f'{path.name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()
+
+
+def _visitor_state() -> str | None:
+    """
+    Résume ce qui varie d'un visiteur à l'autre dans la page (en-tête : prénom, badge du panier).
+    Retourne None si la page contient un message à usage unique (flash, erreur de connexion) :
+    elle doit alors être rendue pour que le message soit affiché puis consommé.
+    """
+    if '_flashes' in session or 'login_error' in session:
+        return None
+    user_id = session.get('user_id')
+    cart_count = cart_services.get_count(user_id)
+    if user_id is None and cart_count == 0:
+        return ''
+    return f"{user_id}:{session.get('firstname')}:{cart_count}"
+
+
+def _conditional(validator: str, last_modified: datetime | None, render: Callable[[], str]) -> str | Response:
+    """
+    GET conditionnel : répond 304 sans rendre le template si la version du catalogue, celle des
+    ressources générées (URL à empreinte) et l'état du visiteur n'ont pas changé depuis la dernière
+    réponse envoyée (If-None-Match).
+    Last-Modified/If-Modified-Since n'est utilisé que pour les visiteurs anonymes au panier vide,
+    les seuls pour qui la page ne dépend que du catalogue.
+    """
+    visitor = _visitor_state()
+    if visitor is None:
+        return render()
+
+    etag = catalog_services.digest(f'{validator}:{_templates_version()}:{assets_version()}:{visitor}')
+    if visitor:
+        last_modified = None
+
+    response: Response
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response(render())
+    else:
+        response = Response(status=304)
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # La réponse dépend du cookie de session : le navigateur la garde mais la revalide à chaque fois
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def _render_listing(
+    listing: ProductList, filters: CatalogFilters, base_args: dict[str, Any], **context: Any
+) -> str:
+    """
+    Rend une liste de produits paginée.
+    Avec ?fragment=grid, seule la grille (filtres + produits) est rendue, pour être remplacée côté client.
+    """
+    after, limit = _page_args()
+    products_data, next_cursor = listing.page(after, limit)
+    template = '_catalog_grid.html' if request.args.get('fragment') == 'grid' else 'products.html'
+    return render_template(
+        template,
+        products=products_data,
+        facets=listing.facets,
+        filters=filters,
+        base_args=base_args,
+        page_args=dict(base_args, **filters.to_args()),
+        next_cursor=next_cursor,
+        limit=limit,
+        is_first_page=after is None,
+        **context,
+    )
+
+
 @catalog_bp.route('/')
-def products() -> str:
-    products_data = Product.find_all()
-    categories = Category.find_main_categories()
-    return render_template('products.html', products=products_data, categories=categories)
+def products() -> str | Response:
+    snapshot = catalog_services.get_snapshot()
+    filters = CatalogFilters.from_args(request.args)
+    return _conditional(
+        snapshot.version,
+        snapshot.last_modified,
+        lambda: _render_listing(
+            snapshot.listing(filters=filters),
+            filters,
+            {},
+            categories=snapshot.main_categories,
+        ),
+    )
+
+
+@catalog_bp.route('/search')
+def search() -> str | Response:
+    snapshot = catalog_services.get_snapshot()
+    query = request.args.get('q', '').strip()
+    return _conditional(
+        snapshot.version,
+        snapshot.last_modified,
+        lambda: render_template('search.html', query=query, hits=search_products(query) if query else []),
+    )
 
 
 @catalog_bp.route('/<int:product_id>')
-def product_detail(product_id: int) -> str:
-    product = Product.find_by_id(product_id)
+def product_detail(product_id: int) -> str | Response:
+    snapshot = catalog_services.get_snapshot()
+    product = snapshot.find_product(product_id)
     if not product:
         abort(404)
-    return render_template('product_detail.html', product=product)
+    # Le stock affiché (quantité exacte, choix de quantité) est lu en base : l'instantané n'est pas
+    # reconstruit à chaque réservation. Il fait partie de l'ETag, et Last-Modified (date de
+    # l'instantané) ne peut pas servir de validateur.
+    stock = Product.find_stock(product_id) or 0
+    return _conditional(
+        f'{snapshot.product_version(product)}:{stock}',
+        None,
+        lambda: render_template('product_detail.html', product=product, stock=stock),
+    )
 
 
 @catalog_bp.route('/category/<slug>')
-def category_products(slug: str) -> str:
-    current = Category.query.filter_by(slug=slug).first()
+def category_products(slug: str) -> str | Response:
+    snapshot = catalog_services.get_snapshot()
+    current = snapshot.find_category(slug)
     if not current:
         abort(404)
-    products_data = Product.find_by_any_category_id(current.id)
 
-    categories = Category.find_main_categories()
+    # ?sub=<slug> restreint la liste à une sous-catégorie de la catégorie courante
+    subcategory: CategoryView | None = None
+    sub_slug = request.args.get('sub')
+    if sub_slug:
+        subcategory = next((child for child in current.children if child.slug == sub_slug), None)
 
-    return render_template(
-        'products.html',
-        products=products_data,
-        categories=categories,
-        current_category=current
+    base_args: dict[str, Any] = {'slug': current.slug}
+    if subcategory:
+        base_args['sub'] = subcategory.slug
+
+    filters = CatalogFilters.from_args(request.args)
+    return _conditional(
+        snapshot.version,
+        snapshot.last_modified,
+        lambda: _render_listing(
+            snapshot.listing(subcategory.id if subcategory else current.id, filters),
+            filters,
+            base_args,
+            categories=snapshot.main_categories,
+            current_category=current,
+            current_subcategory=subcategory,
+        ),
     )
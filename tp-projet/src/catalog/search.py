@@ -0,0 +1,204 @@
+"""
+Recherche plein texte des produits avec l'index FTS5 de SQLite.
+
+La table virtuelle products_fts indexe le nom, la marque, la description et les noms de catégories
+de chaque produit (rowid = products.id). Elle est tenue à jour par des triggers SQL, ce qui couvre
+aussi bien l'ORM que les imports en masse ou les requêtes SQL brutes. Les résultats sont classés
+par bm25 et les termes trouvés sont surlignés.
+
+Sur un autre SGBD que SQLite, la recherche retombe sur un simple LIKE (sans classement).
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any
+
+from markupsafe import Markup, escape
+from sqlalchemy import event, or_, text
+
+from src.catalog import services as catalog_services
+from src.catalog.services import ProductView
+from src.models.database import db
+from src.models.product import Product
+
+SEARCH_LIMIT_DEFAULT = 20
+SEARCH_LIMIT_MAX = 100
+
+# Poids bm25 des colonnes (name, brand, description, categories) : un terme dans le nom compte le plus
+_BM25_WEIGHTS = "10.0, 4.0, 1.0, 2.0"
+
+# Délimiteurs temporaires du surlignage, remplacés par <mark> après échappement HTML
+_MARK_OPEN = "\ue000"
+_MARK_CLOSE = "\ue001"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Noms des catégories d'un produit, utilisé par les triggers (alias "p" = ligne produit)
+_CATEGORY_NAMES_SQL = (
+    "coalesce((SELECT name FROM categories WHERE id = {p}.category_id), '') || ' ' || "
+    "coalesce((SELECT name FROM categories WHERE id = {p}.subcategory_id), '')"
+)
+
+
+def _index_row_sql(alias: str) -> str:
+    return (
+        "INSERT INTO products_fts(rowid, name, brand, description, categories) "
+        f"SELECT {alias}.id, {alias}.name, {alias}.brand, coalesce({alias}.description, ''), "
+        f"{_CATEGORY_NAMES_SQL.format(p=alias)}"
+    )
+
+
+_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, brand, description, categories,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        {_index_row_sql("new")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_update
+    AFTER UPDATE OF name, brand, description, category_id, subcategory_id ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+        {_index_row_sql("new")};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_category_update AFTER UPDATE OF name ON categories BEGIN
+        DELETE FROM products_fts WHERE rowid IN (
+            SELECT id FROM products WHERE category_id = new.id OR subcategory_id = new.id
+        );
+        {_index_row_sql("p")} FROM products p WHERE p.category_id = new.id OR p.subcategory_id = new.id;
+    END
+    """,
+]
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """Un résultat de recherche : le produit, les extraits surlignés et le score bm25."""
+
+    product: ProductView
+    name_html: Markup
+    snippet_html: Markup
+    score: float
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.product.id,
+            "name": self.product.name,
+            "slug": self.product.slug,
+            "brand": self.product.brand,
+            "price": self.product.price,
+            "category": self.product.category_name,
+            "subcategory": self.product.subcategory_name,
+            "image": self.product.image,
+            "stock_quantity": self.product.stock_quantity,
+            "highlight": {"name": str(self.name_html), "snippet": str(self.snippet_html)},
+            "score": self.score,
+        }
+
+
+def ensure_index(connection: Any) -> None:
+    """
+    Crée la table FTS5 et ses triggers s'ils n'existent pas, puis reconstruit l'index
+    s'il n'est pas aligné avec la table products (base créée avant l'index, import externe...).
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in _DDL:
+        connection.execute(text(statement))
+    indexed = connection.execute(text("SELECT count(*) FROM products_fts")).scalar()
+    total = connection.execute(text("SELECT count(*) FROM products")).scalar()
+    if indexed != total:
+        connection.execute(text("DELETE FROM products_fts"))
+        connection.execute(text(f"{_index_row_sql('p')} FROM products p"))
+
+
+@event.listens_for(db.metadata, "after_create")
+def _create_index(target: Any, connection: Any, **kw: Any) -> None:
+    ensure_index(connection)
+
+
+@event.listens_for(db.metadata, "before_drop")
+def _drop_index(target: Any, connection: Any, **kw: Any) -> None:
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS products_fts"))
+
+
+def _match_expression(query: str) -> str | None:
+    """
+    Transforme la saisie utilisateur en expression MATCH sûre : chaque mot est mis entre guillemets
+    (la syntaxe FTS5 de l'utilisateur n'est pas interprétée) et le dernier mot est cherché en préfixe.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlight(value: str) -> Markup:
+    return Markup(str(escape(value)).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>"))
+
+
+def _search_fts(match: str, limit: int) -> list[tuple[int, str, str, float]]:
+    rows = db.session.execute(
+        text(
+            "SELECT rowid, "
+            "highlight(products_fts, 0, :open, :close), "
+            "snippet(products_fts, 2, :open, :close, '…', 16), "
+            f"bm25(products_fts, {_BM25_WEIGHTS}) AS rank "
+            "FROM products_fts WHERE products_fts MATCH :match "
+            "ORDER BY rank LIMIT :limit"
+        ),
+        {"open": _MARK_OPEN, "close": _MARK_CLOSE, "match": match, "limit": limit},
+    )
+    # bm25 renvoie un score négatif (plus petit = plus pertinent) : on l'inverse pour l'API
+    return [(row[0], row[1], row[2], -float(row[3])) for row in rows]
+
+
+def _search_like(query: str, limit: int) -> list[tuple[int, str, str, float]]:
+    pattern = f"%{query}%"
+    products = (
+        Product.query.filter(
+            or_(Product.name.ilike(pattern), Product.brand.ilike(pattern), Product.description.ilike(pattern))
+        )
+        .order_by(Product.name, Product.id)
+        .limit(limit)
+        .all()
+    )
+    return [(p.id, p.name, p.description or "", 0.0) for p in products]
+
+
+def search_products(query: str, limit: int = SEARCH_LIMIT_DEFAULT) -> list[SearchHit]:
+    """Retourne les produits correspondant à la recherche, du plus pertinent au moins pertinent."""
+    query = query.strip()
+    match = _match_expression(query)
+    if match is None:
+        return []
+    limit = max(1, min(limit, SEARCH_LIMIT_MAX))
+
+    if db.engine.dialect.name == "sqlite":
+        rows = _search_fts(match, limit)
+    else:
+        rows = _search_like(query, limit)
+
+    snapshot = catalog_services.get_snapshot()
+    hits = []
+    for product_id, name, snippet, score in rows:
+        product = snapshot.find_product(product_id)
+        if product is not None:
+            hits.append(SearchHit(product, _highlight(name), _highlight(snippet), score))
+    return hits
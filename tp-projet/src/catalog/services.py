@@ -0,0 +1,407 @@
+"""
+Read model du catalogue : produits et arbre des catégories gardés en mémoire dans chaque worker.
+
+Le catalogue change quelques fois par jour alors qu'il est lu à chaque requête. On construit donc
+un instantané (snapshot) immuable au premier accès, puis les routes le servent sans aller en base.
+
+Invalidation :
+- dans le processus courant, les événements SQLAlchemy (flush, UPDATE/DELETE en masse) marquent
+  la session quand une ligne Product, Category ou ProductImage change, et l'instantané est jeté
+  au commit (after_commit) ;
+- pour les autres workers (gunicorn) et les scripts d'import (datafixtures), le commit remplace
+  aussi un petit fichier témoin (CATALOG_STAMP_FILE). Chaque worker compare l'identité de ce fichier
+  (un simple os.stat, sans requête SQL) avec celle de son instantané et le reconstruit si besoin.
+"""
+
+import hashlib
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Any, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, scoped_session
+
+from src.models.category import Category
+from src.models.product import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, Product, decode_cursor, encode_cursor
+from src.models.product_image import ProductImage
+from src.services.stamp import Stamp, read_stamp, touch_stamp
+
+# Tables dont la modification invalide l'instantané
+CATALOG_TABLES = frozenset({"products", "categories", "product_images"})
+CATALOG_MODELS = (Product, Category, ProductImage)
+
+# Clé posée dans session.info quand la transaction en cours modifie le catalogue
+_CHANGED_KEY = "catalog_changed"
+
+# Clé de configuration du fichier témoin partagé par les processus (src/services/stamp.py)
+_STAMP_KEY = "CATALOG_STAMP_FILE"
+
+# Option d'exécution des UPDATE de stock (réservations, commandes) : ils ne jettent pas l'instantané,
+# qui serait sinon reconstruit à chaque ajout au panier. L'appelant utilise mark_changed() quand le
+# changement est visible dans les pages (produit épuisé, badge « Vite ! »).
+STOCK_ONLY_OPTION = "catalog_stock_only"
+
+
+@dataclass(frozen=True)
+class CategoryView:
+    """Catégorie figée, détachée de la session SQLAlchemy."""
+
+    id: int
+    name: str
+    slug: str
+    parent_id: int | None
+    children: tuple["CategoryView", ...] = ()
+
+
+@dataclass(frozen=True)
+class ProductView:
+    """Produit figé avec les informations utilisées par les templates du catalogue."""
+
+    id: int
+    name: str
+    slug: str
+    brand: str
+    description: str | None
+    price: float
+    stock_quantity: int
+    # Image principale : colonne image du produit, sinon sa première ProductImage
+    image: str | None
+    images: tuple[str, ...]
+    category_id: int
+    subcategory_id: int | None
+    category_name: str | None
+    subcategory_name: str | None
+    subcategory_slug: str
+
+    @property
+    def sort_key(self) -> tuple[str, int]:
+        """Clé de tri du catalogue, identique à celle de Product.find_page."""
+        return (self.name, self.id)
+
+
+@dataclass(frozen=True)
+class PriceBucket:
+    """Tranche de prix proposée dans les filtres (borne haute exclue, None = sans limite)."""
+
+    key: str
+    label: str
+    low: float
+    high: float | None
+
+    def contains(self, price: float) -> bool:
+        return price >= self.low and (self.high is None or price < self.high)
+
+
+PRICE_BUCKETS: tuple[PriceBucket, ...] = (
+    PriceBucket("0-10", "Moins de 10 €", 0, 10),
+    PriceBucket("10-20", "De 10 à 20 €", 10, 20),
+    PriceBucket("20-50", "De 20 à 50 €", 20, 50),
+    PriceBucket("50-", "Plus de 50 €", 50, None),
+)
+
+
+def _price_bucket(price: float) -> str | None:
+    for bucket in PRICE_BUCKETS:
+        if bucket.contains(price):
+            return bucket.key
+    return None
+
+
+@dataclass(frozen=True)
+class CatalogFilters:
+    """Filtres du catalogue lus dans la query string (?brand=...&price=...&in_stock=1)."""
+
+    brands: frozenset[str] = frozenset()
+    price: str | None = None
+    in_stock: bool = False
+
+    @classmethod
+    def from_args(cls, args: Any) -> "CatalogFilters":
+        price = args.get("price") or None
+        if price not in {bucket.key for bucket in PRICE_BUCKETS}:
+            price = None
+        return cls(
+            brands=frozenset(b for b in args.getlist("brand") if b),
+            price=price,
+            in_stock=args.get("in_stock") == "1",
+        )
+
+    def is_empty(self) -> bool:
+        return not self.brands and self.price is None and not self.in_stock
+
+    def to_args(self) -> dict[str, Any]:
+        """Paramètres d'URL équivalents, pour conserver les filtres dans les liens de pagination."""
+        args: dict[str, Any] = {}
+        if self.brands:
+            args["brand"] = sorted(self.brands)
+        if self.price:
+            args["price"] = self.price
+        if self.in_stock:
+            args["in_stock"] = "1"
+        return args
+
+
+@dataclass(frozen=True)
+class Facets:
+    """
+    Nombre de produits par valeur de filtre. Chaque compteur applique les autres filtres actifs
+    mais pas le sien : cocher une marque n'annule pas le compteur des autres marques.
+    """
+
+    brands: tuple[tuple[str, int], ...]
+    prices: tuple[tuple[PriceBucket, int], ...]
+    in_stock: int
+
+
+@dataclass(frozen=True)
+class ProductList:
+    """Liste de produits triée par (nom, id) avec ses clés (pagination par curseur) et ses facettes."""
+
+    items: tuple[ProductView, ...]
+    keys: tuple[tuple[str, int], ...]
+    facets: Facets
+
+    @classmethod
+    def of(cls, items: Iterable[ProductView]) -> "ProductList":
+        return cls._filter(items, CatalogFilters())
+
+    @classmethod
+    def _filter(cls, items: Iterable[ProductView], filters: CatalogFilters) -> "ProductList":
+        """Filtre les produits et calcule toutes les facettes en un seul passage."""
+        brand_counts: dict[str, int] = {}
+        price_counts = dict.fromkeys((bucket.key for bucket in PRICE_BUCKETS), 0)
+        in_stock_count = 0
+        matched: list[ProductView] = []
+
+        for product in items:
+            bucket = _price_bucket(product.price)
+            brand_ok = not filters.brands or product.brand in filters.brands
+            price_ok = filters.price is None or bucket == filters.price
+            stock_ok = not filters.in_stock or product.stock_quantity > 0
+
+            brand_counts.setdefault(product.brand, 0)
+            if price_ok and stock_ok:
+                brand_counts[product.brand] += 1
+            if brand_ok and stock_ok and bucket is not None:
+                price_counts[bucket] += 1
+            if brand_ok and price_ok and product.stock_quantity > 0:
+                in_stock_count += 1
+            if brand_ok and price_ok and stock_ok:
+                matched.append(product)
+
+        facets = Facets(
+            brands=tuple(sorted(brand_counts.items())),
+            prices=tuple((bucket, price_counts[bucket.key]) for bucket in PRICE_BUCKETS),
+            in_stock=in_stock_count,
+        )
+        return cls(tuple(matched), tuple(p.sort_key for p in matched), facets)
+
+    def filter(self, filters: CatalogFilters) -> "ProductList":
+        if filters.is_empty():
+            return self
+        return self._filter(self.items, filters)
+
+    def page(self, after: str | None, limit: int) -> tuple[list[ProductView], str | None]:
+        limit = max(1, min(limit, PAGE_SIZE_MAX))
+        position = decode_cursor(after)
+        start = bisect_right(self.keys, position) if position is not None else 0
+        page = list(self.items[start:start + limit])
+        if start + limit >= len(self.items):
+            return page, None
+        return page, encode_cursor(page[-1].name, page[-1].id)
+
+
+_EMPTY_LIST = ProductList.of([])
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Instantané immuable du catalogue (produits + arbre des catégories)."""
+
+    stamp: Stamp | None
+    # Empreinte du contenu : identique dans tous les workers pour un même catalogue (sert d'ETag)
+    version: str
+    # Date du dernier changement connu du catalogue (date du fichier témoin)
+    last_modified: datetime | None
+    products: ProductList
+    products_by_id: dict[int, ProductView]
+    products_by_category: dict[int, ProductList]
+    categories_by_id: dict[int, CategoryView]
+    categories_by_slug: dict[str, CategoryView]
+    main_categories: tuple[CategoryView, ...]
+
+    def listing(self, category_id: int | None = None, filters: CatalogFilters | None = None) -> ProductList:
+        """
+        Produits d'une catégorie (ou de tout le catalogue) après filtres, avec leurs facettes.
+        Sans filtre, la liste et ses facettes sont celles précalculées à la construction.
+        """
+        if category_id is None:
+            products = self.products
+        else:
+            products = self.products_by_category.get(category_id, _EMPTY_LIST)
+        return products.filter(filters) if filters is not None else products
+
+    def page(
+        self,
+        after: str | None = None,
+        limit: int = PAGE_SIZE_DEFAULT,
+        category_id: int | None = None,
+    ) -> tuple[list[ProductView], str | None]:
+        """Même contrat que Product.find_page, mais servi depuis la mémoire (recherche dichotomique)."""
+        return self.listing(category_id).page(after, limit)
+
+    def find_product(self, product_id: int) -> ProductView | None:
+        return self.products_by_id.get(product_id)
+
+    def product_version(self, product: ProductView) -> str:
+        """Empreinte d'un seul produit : la fiche produit ne change pas quand un autre produit change."""
+        return digest(repr(product))
+
+    def find_category(self, slug: str) -> CategoryView | None:
+        return self.categories_by_slug.get(slug)
+
+
+_snapshot: CatalogSnapshot | None = None
+_lock = threading.Lock()
+
+
+def digest(value: str) -> str:
+    """Empreinte courte (hexadécimale) d'une chaîne, utilisée pour les versions et les ETags."""
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _build_snapshot(stamp: Stamp | None) -> CatalogSnapshot:
+    categories = Category.query.order_by(Category.id).all()
+    children: dict[int, list[Category]] = {}
+    for category in categories:
+        if category.parent_id is not None:
+            children.setdefault(category.parent_id, []).append(category)
+
+    categories_by_id: dict[int, CategoryView] = {}
+    for category in categories:
+        categories_by_id[category.id] = CategoryView(
+            id=category.id,
+            name=category.name,
+            slug=category.slug,
+            parent_id=category.parent_id,
+            children=tuple(
+                CategoryView(id=c.id, name=c.name, slug=c.slug, parent_id=c.parent_id)
+                for c in children.get(category.id, [])
+            ),
+        )
+
+    products: list[ProductView] = []
+    members: dict[int, list[ProductView]] = {}
+    for product in Product.listing_query().order_by(Product.name, Product.id).all():
+        view = ProductView(
+            id=product.id,
+            name=product.name,
+            slug=product.slug,
+            brand=product.brand,
+            description=product.description,
+            price=product.price,
+            stock_quantity=product.stock_quantity,
+            image=product.image_url,
+            images=tuple(product.get_images_url()),
+            category_id=product.category_id,
+            subcategory_id=product.subcategory_id,
+            category_name=product.category.name if product.category else None,
+            subcategory_name=product.subcategory.name if product.subcategory else None,
+            subcategory_slug=product.subcategory_slug,
+        )
+        products.append(view)
+        for category_id in {product.category_id, product.subcategory_id}:
+            if category_id is not None:
+                members.setdefault(category_id, []).append(view)
+
+    content = hashlib.blake2b(digest_size=16)
+    for item in chain(categories_by_id.values(), products):
+        content.update(repr(item).encode("utf-8"))
+
+    return CatalogSnapshot(
+        stamp=stamp,
+        version=content.hexdigest(),
+        last_modified=datetime.fromtimestamp(stamp[1] // 1_000_000_000, tz=timezone.utc) if stamp else None,
+        products=ProductList.of(products),
+        products_by_id={p.id: p for p in products},
+        products_by_category={cid: ProductList.of(items) for cid, items in members.items()},
+        categories_by_id=categories_by_id,
+        categories_by_slug={c.slug: c for c in categories_by_id.values()},
+        main_categories=tuple(c for c in categories_by_id.values() if c.parent_id is None),
+    )
+
+
+def get_snapshot() -> CatalogSnapshot:
+    """
+    Retourne l'instantané du catalogue du worker, en le (re)construisant s'il n'existe pas encore
+    ou si un autre processus a modifié le catalogue depuis sa construction.
+    """
+    global _snapshot
+    # Le témoin est lu AVANT les requêtes de construction : un commit concurrent
+    # le modifiera après cette lecture et provoquera une reconstruction au prochain appel.
+    stamp = read_stamp(_STAMP_KEY)
+    if stamp is None:
+        # Premier démarrage : on crée le témoin pour que tous les workers partagent la même date
+        touch_stamp(_STAMP_KEY)
+        stamp = read_stamp(_STAMP_KEY)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.stamp == stamp:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.stamp != stamp:
+            _snapshot = _build_snapshot(stamp)
+        return _snapshot
+
+
+def invalidate() -> None:
+    """Jette l'instantané local et prévient les autres processus."""
+    global _snapshot
+    _snapshot = None
+    touch_stamp(_STAMP_KEY)
+
+
+# --- Invalidation pilotée par les commits ---
+
+
+def _is_catalog_object(obj: Any) -> bool:
+    return isinstance(obj, CATALOG_MODELS)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_changes(session: Session, flush_context: Any) -> None:
+    if any(_is_catalog_object(obj) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_changes(orm_execute_state: Any) -> None:
+    """Repère les INSERT/UPDATE/DELETE en masse (ex: query(Product).delete()) qui contournent le flush."""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.execution_options.get(STOCK_ONLY_OPTION):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if getattr(table, "name", None) in CATALOG_TABLES:
+        mark_changed(orm_execute_state.session)
+
+
+def mark_changed(session: Session | scoped_session[Any]) -> None:
+    """
+    Demande l'invalidation de l'instantané au commit de la transaction en cours.
+    session est la session elle-même ou db.session (scoped_session), qui partage son info.
+    """
+    session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    if session.info.pop(_CHANGED_KEY, False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
@@ -7,5 +7,6 @@ from src.models.product_image import ProductImage
 from src.models.user import User
 from src.models.cart import Cart
 from src.models.cart_item import CartItem 
+from src.models.stock_reservation import StockReservation
 
-__all__ = ["Category", "Product", "ProductImage", "User", "Cart", "CartItem", "db"]
\ No newline at end of file
+__all__ = ["Category", "Product", "ProductImage", "User", "Cart", "CartItem", "StockReservation", "db"]
\ No newline at end of file
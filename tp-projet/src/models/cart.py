@@ -3,10 +3,14 @@
 from datetime import datetime
 from typing import TYPE_CHECKING, cast
 
+from sqlalchemy import ColumnElement, Row, Select
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import QueryableAttribute, joinedload
+
+from src.models.cart_item import CartItem
 from src.models.database import db
 
 if TYPE_CHECKING:
-    from src.models.cart_item import CartItem
     from src.models.product import Product
 
 
@@ -28,6 +32,9 @@ class Cart(db.Model):  # type: ignore
     status = db.Column(db.String(20), nullable=False, default="cart")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     ordered_at = db.Column(db.DateTime, nullable=True)
+    # Clé fournie par le client à la validation : un nouvel essai avec la même clé renvoie la
+    # commande déjà passée au lieu d'en créer une seconde
+    idempotency_key = db.Column(db.String(64), nullable=True)
 
     __table_args__ = (
         db.Index(
@@ -37,6 +44,23 @@ class Cart(db.Model):  # type: ignore
             sqlite_where=db.text("status = 'cart'"),
             postgresql_where=db.text("status = 'cart'"),
         ),
+        db.UniqueConstraint("user_id", "idempotency_key", name="uq_carts_user_idempotency_key"),
+        # Historique des commandes, paginé par clé (ordered_at, id) : l'index fournit à la fois le
+        # filtre et l'ordre, la page se lit sans tri ni parcours de la table. Index partiels : seules
+        # les commandes (tout statut autre que "cart") y figurent
+        db.Index(
+            "ix_carts_user_orders_ordered_at",
+            "user_id",
+            "ordered_at",
+            sqlite_where=db.text("status != 'cart'"),
+            postgresql_where=db.text("status != 'cart'"),
+        ),
+        db.Index(
+            "ix_carts_orders_ordered_at",
+            "ordered_at",
+            sqlite_where=db.text("status != 'cart'"),
+            postgresql_where=db.text("status != 'cart'"),
+        ),
     )
 
     user = db.relationship("User", backref="carts")
@@ -45,32 +69,71 @@ class Cart(db.Model):  # type: ignore
     def __repr__(self) -> str:
         return f"<Cart {self.id} (user={self.user_id}, status={self.status})>"
 
-    @property
+    @hybrid_property
     def total(self) -> float:
+        """Montant total du panier, calculé par la base (SUM(quantity * unit_price))."""
+        return cast(
+            float,
+            db.session.scalar(
+                db.select(db.func.coalesce(db.func.sum(CartItem.subtotal), 0.0)).where(
+                    CartItem.cart_id == self.id
+                )
+            ),
+        )
 
-        """Calcule le montant total du panier."""
-        return cast(float, sum(item.subtotal for item in self.items.all()))
+    @total.inplace.expression
+    @classmethod
+    def _total_expression(cls) -> ColumnElement[float]:
+        # Sous-requête corrélée : Cart.total peut figurer dans un SELECT ou un ORDER BY sur les commandes
+        return cast(
+            ColumnElement[float],
+            db.select(db.func.coalesce(db.func.sum(CartItem.subtotal), 0.0))
+            .where(CartItem.cart_id == cls.id)
+            .scalar_subquery(),
+        )
 
-    @property
+    @hybrid_property
     def item_count(self) -> int:
-        """Retourne le nombre total d'articles."""
-        return sum(item.quantity for item in self.items.all())
+        """Retourne le nombre total d'articles (SUM(quantity))."""
+        return cast(
+            int,
+            db.session.scalar(
+                db.select(db.func.coalesce(db.func.sum(CartItem.quantity), 0)).where(
+                    CartItem.cart_id == self.id
+                )
+            ),
+        )
+
+    @item_count.inplace.expression
+    @classmethod
+    def _item_count_expression(cls) -> ColumnElement[int]:
+        return cast(
+            ColumnElement[int],
+            db.select(db.func.coalesce(db.func.sum(CartItem.quantity), 0))
+            .where(CartItem.cart_id == cls.id)
+            .scalar_subquery(),
+        )
 
     def get_items(self) -> list["CartItem"]:
-        """Retourne la liste des articles du panier."""
-        return list(self.items.all())
+        """Retourne la liste des articles du panier, produits chargés dans la même requête."""
+        return cast(
+            list["CartItem"],
+            self.items.options(joinedload(cast(QueryableAttribute, CartItem.product)))
+            .order_by(CartItem.id)
+            .all(),
+        )
 
     def to_dict(self) -> dict:
-        all_items = cast(list["CartItem"], self.items.all())
+        # Une seule requête : lignes et produits ensemble, total calculé sur les lignes chargées
+        all_items = self.get_items()
         return {
             "id": self.id,
             "user_id": self.user_id,
             "status": self.status,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "ordered_at": self.ordered_at.isoformat() if self.ordered_at else None,
-
-            "items": [item.to_dict() for item in self.items.all()],
-            "total": self.total,
+            "items": [item.to_dict() for item in all_items],
+            "total": sum(item.subtotal for item in all_items),
         }
 
     def add_product(self, product: "Product", quantity: int = 1) -> "CartItem":
@@ -79,8 +142,6 @@ class Cart(db.Model):  # type: ignore
         Ajoute un produit au panier.
         Si le produit est déjà présent, définit la quantité (ne l'incrémente pas).
         """
-        from src.models.cart_item import CartItem  # noqa: PLC0415
-
 
         item = CartItem.query.filter_by(cart_id=self.id, product_id=product.id).first()
 
@@ -100,8 +161,6 @@ class Cart(db.Model):  # type: ignore
 
     def remove_product(self, product_id: int) -> bool:
         """Supprime un produit du panier. Retourne True si supprimé."""
-        from src.models.cart_item import CartItem  # noqa: PLC0415
-
 
         item = CartItem.query.filter_by(cart_id=self.id, product_id=product_id).first()
         if item:
@@ -113,8 +172,6 @@ class Cart(db.Model):  # type: ignore
     def update_quantity(self, product_id: int, quantity: int) -> bool:
 
         """Met à jour la quantité d'un produit. Retourne True si mis à jour."""
-        from src.models.cart_item import CartItem  # noqa: PLC0415
-
 
         item = CartItem.query.filter_by(cart_id=self.id, product_id=product_id).first()
         if item:
@@ -127,17 +184,27 @@ class Cart(db.Model):  # type: ignore
         return False
 
     def clear(self) -> None:
-
-        """Vide le panier de tous ses articles."""
-        for item in self.items.all():
-            db.session.delete(item)
-            db.session.commit()
-
-    def place_order(self) -> None:
-        self.status = "ordered"
-        self.ordered_at = datetime.utcnow()
+        """Vide le panier de tous ses articles en une instruction DELETE."""
+        db.session.execute(
+            db.delete(CartItem)
+            .where(CartItem.cart_id == self.id)
+            .execution_options(synchronize_session="fetch")
+        )
         db.session.commit()
 
+    def place_order(self, idempotency_key: str | None = None) -> bool:
+        """
+        Passe le panier au statut "ordered" par un UPDATE conditionnel (status = 'cart'), sans commit :
+        la transaction est pilotée par le service de validation (src/cart/checkout.py).
+        Retourne False si le panier a déjà été commandé (validation concurrente).
+        """
+        updated = db.session.execute(
+            db.update(Cart)
+            .where(Cart.id == self.id, Cart.status == "cart")
+            .values(status="ordered", ordered_at=datetime.utcnow(), idempotency_key=idempotency_key)
+        ).rowcount
+        return bool(updated)
+
     @classmethod
     def find_by_id(cls, cart_id: int) -> "Cart | None":
         return cast("Cart | None", cls.query.get(cart_id))
@@ -155,18 +222,41 @@ class Cart(db.Model):  # type: ignore
         return cart
 
     @classmethod
-    def find_orders_by_user(cls, user_id: int) -> list["Cart"]:
+    def find_by_idempotency_key(cls, user_id: int, idempotency_key: str) -> "Cart | None":
         return cast(
-            list["Cart"],
-            cls.query.filter(cls.user_id == user_id, cls.status != "cart")
-            .order_by(cls.ordered_at.desc())
-            .all(),
+            "Cart | None", cls.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
         )
 
     @classmethod
-    def find_all_orders(cls) -> list["Cart"]:
-        return cast(
-            list[Cart],
-            cls.query.filter(cls.status != "cart").order_by(cls.ordered_at.desc()).all(),
+    def orders_query(
+        cls,
+        user_id: int | None = None,
+        status: str | None = None,
+        before: tuple[datetime, int] | None = None,
+    ) -> Select:
+        """
+        Requête des commandes (id, user_id, status, ordered_at, item_count, total), les plus récentes
+        d'abord : tous les paniers validés quel que soit leur statut, ou seulement ceux du statut donné.
+        before : clé (ordered_at, id) de la dernière commande de la page précédente.
+        La condition status != 'cart' est écrite en littéral, identique à celle des index partiels,
+        pour que SQLite puisse les utiliser (un paramètre lié ne correspond pas).
+        """
+        query = db.select(
+            cls.id, cls.user_id, cls.status, cls.ordered_at, cls.item_count, cls.total
+        ).where(cls.status != db.literal_column("'cart'"), cls.ordered_at.isnot(None))
+        if status is not None:
+            query = query.where(cls.status == status)
+        if user_id is not None:
+            query = query.where(cls.user_id == user_id)
+        if before is not None:
+            ordered_at, cart_id = before
+            query = query.where(
+                db.or_(cls.ordered_at < ordered_at, db.and_(cls.ordered_at == ordered_at, cls.id < cart_id))
+            )
+        return cast(Select, query.order_by(cls.ordered_at.desc(), cls.id.desc()))
 
-        )
+    @classmethod
+    def find_orders_by_user(
+        cls, user_id: int, limit: int, before: tuple[datetime, int] | None = None
+    ) -> list[Row]:
+        return list(db.session.execute(cls.orders_query(user_id, before=before).limit(limit)))
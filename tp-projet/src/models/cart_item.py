@@ -2,6 +2,8 @@
 
 from typing import cast
 
+from sqlalchemy.ext.hybrid import hybrid_property
+
 from src.models.database import db
 
 
@@ -19,15 +21,18 @@ class CartItem(db.Model):  # type: ignore
     quantity = db.Column(db.Integer, nullable=False, default=1)
     unit_price = db.Column(db.Float, nullable=False)
 
+    # Un produit n'apparaît qu'une fois par panier (cible des upserts ON CONFLICT)
+    __table_args__ = (db.UniqueConstraint("cart_id", "product_id", name="uq_cart_items_cart_product"),)
+
     # Relation vers Product
     product = db.relationship("Product")
 
     def __repr__(self) -> str:
         return f"<CartItem {self.product_id} x{self.quantity}>"
 
-    @property
+    @hybrid_property
     def subtotal(self) -> float:
-        """Calcule le sous-total de la ligne (prix x quantité)."""
+        """Calcule le sous-total de la ligne (prix x quantité), aussi utilisable dans une requête."""
         return cast(float, self.unit_price * self.quantity)
 
     def to_dict(self) -> dict:
@@ -1,11 +1,42 @@
 """Modèle Product pour les produits du site LeVélo."""
 
-from typing import Any, cast
+import base64
+import json
+from typing import TYPE_CHECKING, Any, cast
 
-from sqlalchemy import or_
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import QueryableAttribute, joinedload, selectinload
 
+from src.models.category import Category
 from src.models.database import db
 
+if TYPE_CHECKING:
+    from src.models.product_image import ProductImage
+
+# Taille de page par défaut et maximale pour la pagination du catalogue
+PAGE_SIZE_DEFAULT = 24
+PAGE_SIZE_MAX = 100
+
+
+def encode_cursor(name: str, product_id: int) -> str:
+    """Encode la clé de tri (nom, id) du dernier produit d'une page en curseur opaque pour l'URL."""
+    raw = json.dumps([name, product_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> tuple[str, int] | None:
+    """Décode un curseur produit par encode_cursor. Retourne None si le curseur est absent ou invalide."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, product_id = json.loads(raw.decode("utf-8"))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(name, str) or not isinstance(product_id, int):
+        return None
+    return name, product_id
+
 
 class Product(db.Model):  # type: ignore
     """
@@ -28,6 +59,14 @@ class Product(db.Model):  # type: ignore
     # subcategory_id stocke l'ID de la sous-catégorie (optionnel)
     subcategory_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=True)
 
+    # Index composites pour la pagination par curseur (tri sur nom puis id) :
+    # chaque page est lue directement dans l'index, quelle que soit la profondeur
+    __table_args__ = (
+        db.Index("ix_products_name_id", "name", "id"),
+        db.Index("ix_products_category_name_id", "category_id", "name", "id"),
+        db.Index("ix_products_subcategory_name_id", "subcategory_id", "name", "id"),
+    )
+
     # category permet d'accéder directement à l'objet Category via product.category
     # foreign_keys indique quelle colonne utiliser (car on a 2 relations vers Category)
     # backref='products' permet d'accéder aux produits depuis une catégorie via category.products
@@ -40,22 +79,24 @@ class Product(db.Model):  # type: ignore
     # images permet d'accéder à la liste des images via product.images
     # cascade='all, delete-orphan' supprime les images si le produit est supprimé
     # order_by trie les images par ordre croissant
+    # lazy="select" : la liste est chargée au premier accès pour un produit isolé, et peut être
+    # préchargée pour toute une liste de produits avec selectinload (une seule requête IN)
     images = db.relationship(
         "ProductImage",
         backref="product",
-        lazy="dynamic",
+        lazy="select",
         cascade="all, delete-orphan",
         order_by="ProductImage.order",
     )
 
     def get_images_url(self) -> list[str]:
         """Retourne la liste des URLs des images du produit."""
-        return [img.url for img in self.images.all()]
+        return [img.url for img in cast(list["ProductImage"], self.images)]
 
     def get_first_image_url(self) -> str | None:
         """Retourne l'URL de la première image ou None si aucune image."""
-        first = self.images.first()
-        return first.url if first else None
+        images = cast(list["ProductImage"], self.images)
+        return images[0].url if images else None
 
     # Ajoute une propriété dynamiques pour accéder à l'URL de la première image
     @property
@@ -71,6 +112,11 @@ class Product(db.Model):  # type: ignore
         """Propriété qui retourne la liste des URLs des images (pour compatibilité)."""
         return self.get_images_url()
 
+    @property
+    def subcategory_slug(self) -> str:
+        """Retourne le slug de la sous-catégorie (chaîne vide si aucune), utilisé par les templates."""
+        return str(self.subcategory.slug) if self.subcategory else ""
+
     def __repr__(self) -> str:
         """
         Retourne une représentation lisible de l'objet Product pour le debug.
@@ -101,6 +147,12 @@ class Product(db.Model):  # type: ignore
         """Retourne un produit par son ID ou None s'il n'existe pas."""
         return cast("Product | None", cls.query.get(product_id))
 
+    @classmethod
+    def find_stock(cls, product_id: int) -> int | None:
+        """Retourne le stock disponible d'un produit (une seule colonne lue) ou None s'il n'existe pas."""
+        stmt = db.select(cls.stock_quantity).where(cls.id == product_id)
+        return cast("int | None", db.session.scalar(stmt))
+
     @classmethod
     def find_by_name(cls, name: str) -> "Product | None":
         """Retourne un produit par son nom ou None s'il n'existe pas."""
@@ -126,6 +178,53 @@ class Product(db.Model):  # type: ignore
         """Retourne la liste de tous les produits."""
         return cast(list[Product], cls.query.all())
 
+    @classmethod
+    def listing_query(cls) -> Any:
+        """
+        Retourne la requête de base des listes de produits (catalogue, catégories).
+        La catégorie, la sous-catégorie et son parent sont chargés dans la même requête (JOIN),
+        ce qui évite un SELECT supplémentaire par carte produit lors du rendu.
+        Les images de tous les produits de la liste sont chargées en une seule requête supplémentaire
+        (SELECT ... WHERE product_id IN (...)), pour image_url et to_dict.
+        """
+        # db.relationship est typé RelationshipProperty ; sur la classe, c'est un attribut instrumenté
+        return cls.query.options(
+            joinedload(cast(QueryableAttribute, cls.category)),
+            joinedload(cast(QueryableAttribute, cls.subcategory)).joinedload(
+                cast(QueryableAttribute, Category.parent)
+            ),
+            selectinload(cast(QueryableAttribute, cls.images)),
+        )
+
+    @classmethod
+    def find_page(
+        cls,
+        after: str | None = None,
+        limit: int = PAGE_SIZE_DEFAULT,
+        category_id: int | None = None,
+    ) -> tuple[list["Product"], str | None]:
+        """
+        Retourne une page de produits triés par (nom, id) et le curseur de la page suivante.
+        La pagination se fait par curseur (keyset) : on reprend après le dernier produit vu
+        au lieu d'utiliser un OFFSET, le coût reste donc proportionnel à la taille de la page.
+        Si category_id est fourni, filtre sur la catégorie principale ou la sous-catégorie.
+        Le curseur retourné vaut None s'il n'y a plus de produits.
+        """
+        limit = max(1, min(limit, PAGE_SIZE_MAX))
+        query = cls.listing_query()
+        if category_id is not None:
+            query = query.filter(or_(cls.category_id == category_id, cls.subcategory_id == category_id))
+        position = decode_cursor(after)
+        if position is not None:
+            name, product_id = position
+            query = query.filter(or_(cls.name > name, and_(cls.name == name, cls.id > product_id)))
+        # On lit un produit de plus pour savoir s'il existe une page suivante
+        rows = cast(list[Product], query.order_by(cls.name, cls.id).limit(limit + 1).all())
+        if len(rows) <= limit:
+            return rows, None
+        page = rows[:limit]
+        return page, encode_cursor(page[-1].name, page[-1].id)
+
     @classmethod
     def find_by_category_id(cls, category_id: int) -> list["Product"]:
         """Retourne la liste des produits d'une catégorie donnée."""
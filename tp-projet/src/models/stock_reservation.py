@@ -0,0 +1,55 @@
+"""Modèle StockReservation pour les quantités bloquées par les paniers."""
+
+from datetime import datetime, timedelta
+from typing import cast
+
+from src.models.database import db
+
+
+class StockReservation(db.Model):  # type: ignore
+    """
+    Quantité d'un produit réservée par un panier, déjà déduite de products.stock_quantity.
+
+    Le détenteur (holder) est "user:<id>" pour un utilisateur connecté ou "session:<jeton>" pour un
+    visiteur. Une réservation expirée est rendue au stock par le balayage des réservations.
+    """
+
+    __tablename__ = "stock_reservations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    holder = db.Column(db.String(64), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("holder", "product_id", name="uq_stock_reservations_holder_product"),
+        db.Index("ix_stock_reservations_expires_at", "expires_at"),
+    )
+
+    product = db.relationship("Product")
+
+    def __repr__(self) -> str:
+        return f"<StockReservation {self.holder} product={self.product_id} x{self.quantity}>"
+
+    @property
+    def is_expired(self) -> bool:
+        return cast(bool, self.expires_at < datetime.utcnow())
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "holder": self.holder,
+            "product_id": self.product_id,
+            "quantity": self.quantity,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    @staticmethod
+    def expiry(ttl_seconds: int) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=ttl_seconds)
+
+    @classmethod
+    def find_by_holder(cls, holder: str) -> list["StockReservation"]:
+        return cast(list["StockReservation"], cls.query.filter_by(holder=holder).all())
@@ -25,6 +25,9 @@ class User(db.Model):  # type: ignore
     ville = db.Column(db.String(64))
     pays = db.Column(db.String(64))
 
+    # Recherche d'email insensible à la casse (find_by_email) servie par un index
+    __table_args__ = (db.Index("ix_users_email_lower", db.func.lower(email)),)
+
     def __repr__(self) -> str:
         return f"<User {self.username} ({self.role})>"
 
@@ -51,8 +54,8 @@ class User(db.Model):  # type: ignore
 
     @classmethod
     def find_by_email(cls, email: str) -> "User | None":
-        """Retourne un utilisateur par son email ou None s'il n'existe pas."""
-        return cast("User | None", cls.query.filter_by(email=email).first())
+        """Retourne un utilisateur par son email (sans tenir compte de la casse) ou None s'il n'existe pas."""
+        return cast("User | None", cls.query.filter(db.func.lower(cls.email) == email.lower()).first())
 
     @classmethod
     def find_by_username(cls, username: str) -> "User | None":
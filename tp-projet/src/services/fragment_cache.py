@@ -0,0 +1,108 @@
+"""
+Cache de fragments pour les templates Jinja.
+
+Usage dans un template :
+
+    {% cache ("product-card", product.id, catalog_version), 3600 %}
+        ... markup coûteux à produire ...
+    {% endcache %}
+
+La clé est une expression quelconque (souvent un tuple) et la durée de vie, en secondes, est
+optionnelle. Les fragments sont gardés dans un LRU borné propre à chaque worker. Tout ce qui
+dépend de l'utilisateur (badge du panier, bloc de connexion) doit rester hors des blocs cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.parser import Parser
+from markupsafe import Markup
+
+FRAGMENT_CACHE_SIZE_DEFAULT = 2048
+FRAGMENT_CACHE_TTL_DEFAULT = 3600
+
+
+class LRUFragmentStore:
+    """LRU borné (nombre d'entrées) avec expiration, compteurs de succès/échecs et verrou."""
+
+    def __init__(
+        self, max_entries: int = FRAGMENT_CACHE_SIZE_DEFAULT, default_ttl: int = FRAGMENT_CACHE_TTL_DEFAULT
+    ) -> None:
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: OrderedDict[Hashable, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> str | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: str, ttl: int | None = None) -> None:
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Compteurs du cache, pour le suivi (taux de succès, évictions)."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class FragmentCacheExtension(Extension):
+    """Ajoute la balise {% cache key[, ttl] %}...{% endcache %} à l'environnement Jinja."""
+
+    tags = {"cache"}
+
+    def __init__(self, environment: Any) -> None:
+        super().__init__(environment)
+        environment.extend(fragment_cache=LRUFragmentStore())
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render_cached", args), [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key: Any, ttl: int | None, caller: Callable[[], str]) -> str:
+        store: LRUFragmentStore = self.environment.fragment_cache  # type: ignore[attr-defined]
+        cache_key = ("fragment", key)
+        value = store.get(cache_key)
+        if value is None:
+            value = caller()
+            store.set(cache_key, value, ttl)
+        return Markup(value)
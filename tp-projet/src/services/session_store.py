@@ -0,0 +1,279 @@
+"""
+Sessions côté serveur.
+
+Par défaut, Flask garde toute la session (panier compris) dans un cookie signé, resérialisé,
+resigné et renvoyé à chaque réponse, qui grossit avec chaque ligne du panier. Ici le cookie ne
+contient plus qu'un identifiant opaque, aléatoire et non devinable ; les données sont gardées par
+le serveur :
+
+- SESSION_STORE = "sqlite" : une base SQLite dédiée en mode WAL (lectures concurrentes des
+  workers sans blocage, une écriture à la fois) ;
+- SESSION_STORE = "file"   : un fichier par session, remplacé atomiquement ;
+- SESSION_STORE = "cookie" : le cookie signé de Flask, comme avant.
+
+Les données sont encodées avec marshal (binaire compact et rapide, limité aux types de base :
+dict, list, tuple, str, int, float, bool, None), sans risque ici puisqu'elles ne quittent jamais
+le serveur. Une session n'est écrite que si elle a été modifiée pendant la requête. Quand
+l'utilisateur connecté change (connexion, inscription, déconnexion), regenerate_session() donne un
+nouvel identifiant aux mêmes données et supprime l'ancien (protection contre la fixation de
+session). Les sessions expirées (PERMANENT_SESSION_LIFETIME après leur dernière modification) sont
+supprimées par un thread de fond, au plus une fois par SESSION_EVICT_INTERVAL secondes.
+"""
+
+import marshal
+import os
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from flask import Flask, Request, Response, session
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+SESSION_ID_BYTES = 32
+_SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{43}$")
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dont seules les données restent sur le serveur ; sid est l'identifiant du cookie."""
+
+    def __init__(self, initial: dict | None = None, sid: str | None = None) -> None:
+        def on_update(self: "ServerSession") -> None:
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        # Identifiant remplacé par regenerate(), supprimé du stockage à l'enregistrement
+        self.previous_sid: str | None = None
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+
+    def regenerate(self) -> None:
+        """Les données seront enregistrées sous un nouvel identifiant, l'ancien ne sera plus valable."""
+        if self.sid is not None:
+            self.previous_sid = self.sid
+            self.sid = None
+        self.modified = True
+
+    def __getitem__(self, key: str) -> Any:
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self.accessed = True
+        return super().get(key, default)
+
+
+class SQLiteSessionStore:
+    """Sessions dans une base SQLite (WAL), une connexion par thread."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "sid TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+        conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            # WAL : synchronous=NORMAL suffit, une session perdue sur coupure de courant est acceptable
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid: str) -> bytes | None:
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid: str, data: bytes, expires_at: float) -> None:
+        self._conn().execute(
+            "INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+            (sid, data, expires_at),
+        )
+
+    def delete(self, sid: str) -> None:
+        self._conn().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def evict_expired(self) -> int:
+        return self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class FileSessionStore:
+    """Un fichier par session : date d'expiration et données encodées ensemble."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, sid: str) -> Path:
+        return self.directory / sid
+
+    def load(self, sid: str) -> bytes | None:
+        try:
+            expires_at, data = marshal.loads(self._path(sid).read_bytes())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return data if expires_at > time.time() else None
+
+    def save(self, sid: str, data: bytes, expires_at: float) -> None:
+        # Écriture dans un fichier temporaire puis renommage : un lecteur ne voit jamais un fichier partiel
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(marshal.dumps((expires_at, data)))
+            os.replace(tmp_path, self._path(sid))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, sid: str) -> None:
+        self._path(sid).unlink(missing_ok=True)
+
+    def evict_expired(self) -> int:
+        now = time.time()
+        evicted = 0
+        for path in self.directory.iterdir():
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                expires_at, _ = marshal.loads(path.read_bytes())
+            except (OSError, EOFError, ValueError, TypeError):
+                expires_at = 0
+            if expires_at <= now:
+                path.unlink(missing_ok=True)
+                evicted += 1
+        return evicted
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """SessionInterface qui ne met dans le cookie que l'identifiant de session."""
+
+    def __init__(self, store: SQLiteSessionStore | FileSessionStore, evict_interval: int) -> None:
+        self.store = store
+        self.evict_interval = evict_interval
+        self._evictor_pid: int | None = None
+        self._evictor_lock = threading.Lock()
+
+    def _ensure_evictor(self) -> None:
+        # Démarré au premier usage dans chaque processus : un thread lancé avant le fork
+        # des workers gunicorn n'existerait pas dans les workers
+        if self._evictor_pid == os.getpid():
+            return
+        with self._evictor_lock:
+            if self._evictor_pid == os.getpid():
+                return
+            self._evictor_pid = os.getpid()
+            threading.Thread(target=self._evict_loop, name="session-evictor", daemon=True).start()
+
+    def _evict_loop(self) -> None:
+        while True:
+            time.sleep(self.evict_interval)
+            try:
+                self.store.evict_expired()
+            except (sqlite3.Error, OSError):
+                # Base verrouillée, disque plein... : un échec ponctuel ne doit pas arrêter le thread
+                pass
+
+    def open_session(self, app: Flask, request: Request) -> ServerSession:
+        self._ensure_evictor()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not _SESSION_ID_RE.match(sid):
+            return ServerSession()
+        data = self.store.load(sid)
+        if data is None:
+            return ServerSession()
+        try:
+            return ServerSession(marshal.loads(data), sid=sid)
+        except (EOFError, ValueError, TypeError):
+            return ServerSession()
+
+    def save_session(  # type: ignore[override]
+        self, app: Flask, session: ServerSession, response: Response
+    ) -> None:
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+
+        # Session vidée (déconnexion) : suppression côté serveur et du cookie
+        if not session:
+            if session.modified and (session.sid is not None or session.previous_sid is not None):
+                if session.sid is not None:
+                    self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                    httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app),
+                )
+            return
+
+        if not session.modified:
+            return
+
+        known_sid = session.sid is not None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(SESSION_ID_BYTES)
+        expires_at = time.time() + app.permanent_session_lifetime.total_seconds()
+        self.store.save(session.sid, marshal.dumps(dict(session)), expires_at)
+        # Le navigateur a déjà l'identifiant : on ne renvoie le cookie que pour prolonger sa date d'expiration
+        if known_sid and not session.permanent:
+            return
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def regenerate_session() -> None:
+    """
+    Change l'identifiant de la session courante en gardant ses données (panier d'un visiteur).
+    À appeler quand l'utilisateur connecté change. Sans effet avec le cookie signé de Flask,
+    dont le contenu change de toute façon.
+    """
+    regenerate = getattr(session, "regenerate", None)
+    if regenerate is not None:
+        regenerate()
+
+
+def init_session_store(app: Flask) -> None:
+    """Installe le stockage de sessions choisi par SESSION_STORE ("cookie" : Flask par défaut)."""
+    kind = app.config["SESSION_STORE"]
+    if kind == "cookie":
+        return
+    store: SQLiteSessionStore | FileSessionStore
+    if kind == "sqlite":
+        store = SQLiteSessionStore(app.config["SESSION_SQLITE_PATH"])
+    elif kind == "file":
+        store = FileSessionStore(app.config["SESSION_FILE_DIR"])
+    else:
+        raise ValueError(f"SESSION_STORE inconnu : {kind!r} (sqlite, file ou cookie)")
+    app.session_interface = ServerSideSessionInterface(store, app.config["SESSION_EVICT_INTERVAL"])
@@ -0,0 +1,53 @@
+"""
+Fichiers témoins partagés par les processus (workers gunicorn, scripts d'import).
+
+Les données gardées en mémoire par chaque worker (instantané du catalogue, filtres des
+utilisateurs) sont associées à un petit fichier témoin, remplacé atomiquement à chaque commit qui
+les modifie. Un worker compare l'identité du fichier (inode, date de modification : un simple
+os.stat, sans requête SQL) avec celle relevée à la construction de sa copie et la reconstruit si
+elle a changé.
+
+Chaque fonction reçoit la clé de configuration du chemin (ex: "CATALOG_STAMP_FILE") : la valeur
+de l'application courante, ou celle de Config hors contexte d'application.
+"""
+
+import logging
+import os
+import tempfile
+import uuid
+
+from flask import current_app, has_app_context
+
+from config import Config
+
+Stamp = tuple[int, int]
+
+
+def stamp_path(config_key: str) -> str:
+    if has_app_context():
+        return str(current_app.config.get(config_key, getattr(Config, config_key)))
+    return str(getattr(Config, config_key))
+
+
+def read_stamp(config_key: str) -> Stamp | None:
+    """Identité du fichier témoin (inode, date de modification), None s'il n'existe pas."""
+    try:
+        stat = os.stat(stamp_path(config_key))
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def touch_stamp(config_key: str) -> None:
+    """Remplace atomiquement le fichier témoin pour signaler le changement aux autres processus."""
+    path = stamp_path(config_key)
+    directory = os.path.dirname(path) or "."
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}-")
+        with os.fdopen(fd, "w") as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger = current_app.logger if has_app_context() else logging.getLogger(__name__)
+        logger.warning("Impossible de mettre à jour le témoin %s : %s", path, e)
@@ -1,11 +1,19 @@
 const BASE_URL = window.location.origin;
-const API_CART_ADD = `${BASE_URL}/api/cart/add`;
-const API_CART_REMOVE = `${BASE_URL}/api/cart/remove`;
+const API_CART_BATCH = `${BASE_URL}/api/cart/batch`;
+const API_CART_CHECKOUT = `${BASE_URL}/api/cart/checkout`;
+
+// Délai de regroupement des modifications faites sur la page panier (ms)
+const DELAI_ENVOI_PANIER = 300;
+
+let operationsEnAttente = [];
+let minuteurEnvoi = null;
 
 document.addEventListener("DOMContentLoaded", () => {
     configurerBoutonsAjouterPanier();
     configurerBoutonsSupprimerPanier();
     configurerChampQuantitePanier();
+    configurerBoutonCommander();
+    configurerEnvoiAvantDepart();
 });
 
 // --- FONCTIONS DE CONFIGURATION ---
@@ -17,7 +25,7 @@ function configurerBoutonsAjouterPanier() {
             const productId = bouton.dataset.productId;
             const qtyInput = document.getElementById(`qty-${productId}`);
             const quantity = qtyInput ? parseInt(qtyInput.value) : 1;
-            
+
             ajouterAuPanier(productId, quantity);
         });
     });
@@ -39,74 +47,168 @@ function configurerChampQuantitePanier() {
         input.addEventListener('change', (event) => {
             const productId = input.dataset.productId;
             const newQuantity = parseInt(event.target.value);
-            mettreAJourQuantite(productId, newQuantity); 
+            mettreAJourQuantite(productId, newQuantity);
         });
     });
 }
 
+function configurerBoutonCommander() {
+    const bouton = document.querySelector('.checkout-btn');
+    if (!bouton) return;
+    // Une clé par page : un double clic ou un nouvel essai après une coupure réseau
+    // renvoie la même commande au lieu d'en créer une seconde
+    const cleIdempotence = crypto.randomUUID();
+    bouton.addEventListener('click', () => validerCommande(bouton, cleIdempotence));
+}
+
+// Les modifications encore en attente partent tout de suite quand l'utilisateur quitte ou masque
+// la page : sans cela, celles faites moins de DELAI_ENVOI_PANIER ms avant seraient perdues
+function configurerEnvoiAvantDepart() {
+    window.addEventListener('pagehide', envoyerOperationsEnAttente);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') envoyerOperationsEnAttente();
+    });
+}
+
 // --- FONCTIONS API (AJAX) ---
 
 function ajouterAuPanier(productId, quantity) {
-    const url = `${API_CART_ADD}/${productId}`;
+    const operation = { op: 'add', product_id: parseInt(productId), quantity: parseInt(quantity) };
+    envoyerOperations([operation], () => {
+        if (!document.querySelector('.cart-container')) alert("Produit ajouté au panier !");
+    });
+}
+
+function mettreAJourQuantite(productId, quantity) {
+    planifierOperation({ op: 'update', product_id: parseInt(productId), quantity: parseInt(quantity) });
+}
+
+function supprimerDuPanier(productId) {
+    const ligne = document.querySelector(`.cart-item[data-product-id="${productId}"]`);
+    if (ligne) ligne.classList.add('cart-item-removing');
+    planifierOperation({ op: 'remove', product_id: parseInt(productId) });
+}
+
+// Les modifications rapprochées de la page panier partent ensemble dans une seule requête
+function planifierOperation(operation) {
+    // Une seule opération par produit : la dernière saisie l'emporte
+    operationsEnAttente = operationsEnAttente.filter(op => op.product_id !== operation.product_id);
+    operationsEnAttente.push(operation);
+
+    clearTimeout(minuteurEnvoi);
+    minuteurEnvoi = setTimeout(() => envoyerOperations(prendreOperationsEnAttente()), DELAI_ENVOI_PANIER);
+}
+
+// Retire les opérations en attente (et leur minuteur) pour les envoyer
+function prendreOperationsEnAttente() {
+    clearTimeout(minuteurEnvoi);
+    const operations = operationsEnAttente;
+    operationsEnAttente = [];
+    return operations;
+}
 
-    fetch(url, {
+function envoyerOperationsEnAttente() {
+    if (!operationsEnAttente.length) return;
+    // keepalive : la requête est menée à terme même si la page est fermée entre-temps
+    envoyerOperations(prendreOperationsEnAttente(), null, true);
+}
+
+function envoyerOperations(operations, siSucces, keepalive = false) {
+    fetch(API_CART_BATCH, {
         method: 'POST',
+        keepalive: keepalive,
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ quantity: parseInt(quantity) })
+        body: JSON.stringify({ operations: operations })
     })
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
-            const badge = document.getElementById('cart-item-count');
-            if (badge) badge.innerText = data.cart_count;
-            
-            if (document.querySelector('.cart-container')) {
-                window.location.reload();
-            }
-        } else {
-            alert("Erreur : " + data.error);
+        // En cas d'erreur, rien n'a été modifié : la réponse contient l'état actuel du panier
+        if (data.items) afficherPanier(data);
+        if (!data.success) {
+            alert("Erreur : " + (data.message || data.error));
+        } else if (siSucces) {
+            siSucces(data);
         }
     })
     .catch(error => console.error("Erreur API:", error));
 }
 
-function mettreAJourQuantite(productId, quantity) {
-    const url = `${BASE_URL}/api/cart/update/${productId}`;
+function validerCommande(bouton, cleIdempotence) {
+    // Les modifications en attente partent d'abord, la commande ensuite
+    if (operationsEnAttente.length) {
+        envoyerOperations(prendreOperationsEnAttente(), () => validerCommande(bouton, cleIdempotence));
+        return;
+    }
 
-    fetch(url, {
+    bouton.disabled = true;
+    fetch(API_CART_CHECKOUT, {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ quantity: parseInt(quantity) })
+            'Content-Type': 'application/json',
+            'Idempotency-Key': cleIdempotence
+        }
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            window.location.reload();
+            const badge = document.getElementById('cart-item-count');
+            if (badge) badge.innerText = 0;
+            const container = document.querySelector('.cart-container');
+            container.outerHTML = `
+                <div class="text-center py-5">
+                    <h3>Merci ! Votre commande n°${data.order.id} est validée.</h3>
+                    <p class="text-muted">Montant : ${data.order.total} €</p>
+                    <a href="${container.dataset.catalogUrl}" class="btn btn-primary mt-3">Retour au catalogue</a>
+                </div>`;
         } else {
-            alert("Erreur : " + data.error);
+            bouton.disabled = false;
+            alert("Erreur : " + (data.message || data.error));
         }
     })
-    .catch(error => console.error("Erreur API:", error));
+    .catch(error => {
+        bouton.disabled = false;
+        console.error("Erreur API:", error);
+    });
 }
 
-function supprimerDuPanier(productId) {
-    const url = `${API_CART_REMOVE}/${productId}`;
+// --- MISE À JOUR DE LA PAGE ---
 
-    fetch(url, {
-        method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' }
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            window.location.reload();
-        } else {
-            alert("Erreur lors de la suppression");
+function afficherPanier(data) {
+    const badge = document.getElementById('cart-item-count');
+    if (badge) badge.innerText = data.cart_count;
+
+    const container = document.querySelector('.cart-container');
+    if (!container) return;
+
+    if (data.items.length === 0) {
+        container.outerHTML = `
+            <div class="text-center py-5">
+                <h3 class="text-muted">Votre panier est vide.</h3>
+                <a href="${container.dataset.catalogUrl}" class="btn btn-primary mt-3">Retour au catalogue</a>
+            </div>`;
+        return;
+    }
+
+    const lignes = new Map(data.items.map(item => [String(item.product_id), item]));
+    container.querySelectorAll('.cart-item').forEach(ligne => {
+        const item = lignes.get(ligne.dataset.productId);
+        if (!item) {
+            ligne.remove();
+            return;
         }
-    })
-    .catch(error => console.error("Erreur API:", error));
-}
\ No newline at end of file
+        ligne.classList.remove('cart-item-removing');
+        const input = ligne.querySelector('.cart-item-quantity');
+        // Ne pas écraser un champ en cours de saisie
+        if (input && document.activeElement !== input) input.value = item.quantity;
+        if (input) input.max = item.stock_quantity;
+        const sousTotal = ligne.querySelector('.cart-item-subtotal');
+        if (sousTotal) sousTotal.innerText = `${item.subtotal} €`;
+    });
+
+    const count = container.querySelector('.cart-total-count');
+    if (count) count.innerText = data.cart_count;
+    const total = container.querySelector('.cart-total-amount');
+    if (total) total.innerText = data.cart_total;
+}